@@ -0,0 +1,190 @@
+'''
+Pure-Python stand-in for the local-runner side of the protocol
+
+usage: python LocalRunnerServer.py [tick_count | recording] [port]
+serves a scripted 3 x 3 game (or a recording made with Runner.py --record)
+to Runner.py started as a subprocess and prints per-tick latency
+'''
+
+import sys
+import os
+import time
+import math
+import random
+import socket
+import threading
+import subprocess
+
+import codec
+from RemoteProcessClient import RemoteProcessClient
+from WireRecording import read_frames
+from model.Bonus import Bonus
+from model.Obstacle import Obstacle
+from model.Player import Player
+from model.PlayerContext import PlayerContext
+from model.Shell import Shell
+from model.ShellType import ShellType
+from model.Tank import Tank
+from model.TankType import TankType
+from model.World import World
+
+
+class FrameWriter:
+    '''socket stand-in that turns one written message into a frame'''
+    def __init__(self):
+        self.chunks = []
+        self.endpoint = RemoteProcessClient(None, None, self)
+
+    def sendall(self, bytes):
+        self.chunks.append(memoryview(bytes).tobytes())
+
+    def pop(self):
+        self.endpoint.flush()
+        res = ''.join(self.chunks)
+        self.chunks = []
+        return res
+
+    def team_size(self, team_size):
+        self.endpoint.write_enum(RemoteProcessClient.MessageType.TEAM_SIZE)
+        codec.TEAM_SIZE.write(self.endpoint, team_size)
+        return self.pop()
+
+    def player_context(self, player_context):
+        self.endpoint.write_enum(RemoteProcessClient.MessageType.PLAYER_CONTEXT)
+        codec.PLAYER_CONTEXT.write(self.endpoint, player_context)
+        return self.pop()
+
+    def game_over(self):
+        self.endpoint.write_enum(RemoteProcessClient.MessageType.GAME_OVER)
+        return self.pop()
+
+
+def scripted_player_contexts(tick_count, seed=0):
+    '''3 x 3 game with tanks wandering randomly, shells and bonuses appear anywhere
+    tanks are updated in place, so encode each context before taking the next one
+    '''
+    rnd = random.Random(seed)
+    players = [Player(name, 0, False) for name in ['You', 'EmptyPlayer', 'QuickStartGuy']]
+    obstacles = [Obstacle(1, 80., 80., 640., 400.), Obstacle(2, 80., 40., 320., 200.),
+            Obstacle(3, 80., 40., 960., 600.)]
+    tanks = []
+    for player_index, player in enumerate(players):
+        for teammate_index in xrange(3):
+            tanks.append(Tank(1 + player_index * 3 + teammate_index, player.name, teammate_index,
+                    x=rnd.uniform(100., 1180.), y=rnd.uniform(100., 700.),
+                    speed_x=0., speed_y=0., angle=rnd.uniform(-math.pi, math.pi), angular_speed=0.,
+                    turret_relative_angle=0., crew_health=100, hull_durability=200,
+                    reloading_time=150, remaining_reloading_time=0, premium_shell_count=3,
+                    teammate=player_index == 0, type=TankType.MEDIUM))
+
+    for tick in xrange(tick_count):
+        for tank in tanks:
+            tank.speedX = rnd.uniform(-2., 2.)
+            tank.speedY = rnd.uniform(-2., 2.)
+            tank.x = min(1180., max(100., tank.x + tank.speedX))
+            tank.y = min(700., max(100., tank.y + tank.speedY))
+            tank.angle += rnd.uniform(-0.02, 0.02)
+            tank.remaining_reloading_time = (tank.remaining_reloading_time - 1) % 150
+
+        shells = []
+        for shell_index in xrange(rnd.randint(0, 6)):
+            angle = rnd.uniform(-math.pi, math.pi)
+            shells.append(Shell(100 + shell_index, players[shell_index % 3].name, 22.5, 7.5,
+                    rnd.uniform(0., 1280.), rnd.uniform(0., 800.),
+                    16.7 * math.cos(angle), 16.7 * math.sin(angle), angle, 0., ShellType.REGULAR))
+        bonuses = [Bonus(200 + i, 30., 30., rnd.uniform(0., 1280.), rnd.uniform(0., 800.), i % 3)
+                for i in xrange(3)]
+        world = World(tick, 1280., 800., players, obstacles, tanks, shells, bonuses)
+        yield PlayerContext([t for t in tanks if t.teammate], world)
+
+
+def scripted_frames(tick_count, team_size=3, seed=0):
+    '''return inbound frames: team size, one player context per tick and game over'''
+    writer = FrameWriter()
+    frames = [writer.team_size(team_size)]
+    for player_context in scripted_player_contexts(tick_count, seed):
+        frames.append(writer.player_context(player_context))
+    frames.append(writer.game_over())
+    return frames
+
+
+class LocalRunnerServer:
+    '''serves frames to a single client, expects moves after every player context'''
+    def __init__(self, frames, host='localhost', port=0, timeout=60.):
+        self.frames = frames
+        self.timeout = timeout
+        self.server_socket = socket.socket()
+        self.server_socket.settimeout(timeout)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((host, port))
+        self.server_socket.listen(1)
+        self.port = self.server_socket.getsockname()[1]
+
+        self.token = None
+        self.tank_types = None
+        self.moves = []
+        # seconds between sending a player context and receiving the moves
+        self.latencies = []
+
+    def read_message(self, endpoint, expected_type):
+        endpoint.ensure_message_type(endpoint.read_enum(RemoteProcessClient.MessageType), expected_type)
+
+    def serve(self):
+        connection, address = self.server_socket.accept()
+        connection.settimeout(self.timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        endpoint = RemoteProcessClient(None, None, connection)
+        try:
+            self.read_message(endpoint, RemoteProcessClient.MessageType.AUTHENTICATION_TOKEN)
+            self.token = codec.AUTHENTICATION_TOKEN.read(endpoint)
+            connection.sendall(self.frames[0])
+
+            self.read_message(endpoint, RemoteProcessClient.MessageType.TANK_TYPES)
+            self.tank_types = codec.TANK_TYPES.read(endpoint)
+
+            for frame in self.frames[1:-1]:
+                begin = time.time()
+                connection.sendall(frame)
+                self.read_message(endpoint, RemoteProcessClient.MessageType.MOVES)
+                self.moves.append(codec.MOVES.read(endpoint))
+                self.latencies.append(time.time() - begin)
+            connection.sendall(self.frames[-1])
+        finally:
+            connection.close()
+            self.server_socket.close()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve)
+        thread.start()
+        return thread
+
+
+def main():
+    argument = sys.argv[1] if len(sys.argv) > 1 else '200'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    if argument.isdigit():
+        frames = scripted_frames(int(argument))
+    else:
+        frames = read_frames(argument)
+
+    server = LocalRunnerServer(frames, port=port)
+    thread = server.start()
+    runner = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Runner.py')
+    begin = time.time()
+    return_code = subprocess.call([sys.executable, runner, 'localhost', str(server.port), '0000000000000000'])
+    thread.join()
+    seconds = time.time() - begin
+
+    latencies = sorted(server.latencies)
+    tick_count = len(latencies)
+    print 'runner exit code: %d, ticks: %d' % (return_code, tick_count)
+    if tick_count:
+        print 'throughput: %.1f ticks/s, %.1f KB/s inbound' % (
+                tick_count / seconds, sum(len(f) for f in frames) / 1024. / seconds)
+        print 'latency: mean %.2f ms, median %.2f ms, max %.2f ms' % (
+                1000. * sum(latencies) / tick_count, 1000. * latencies[tick_count / 2], 1000. * latencies[-1])
+    sys.exit(return_code)
+
+
+if __name__ == '__main__':
+    main()
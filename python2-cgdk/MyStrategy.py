@@ -1,7 +1,9 @@
 import math
 import time
 import sys
+import heapq
 from collections import defaultdict
+from array import array
 
 from model.FireType import FireType
 from model.TankType import TankType
@@ -75,73 +77,93 @@ def make_zone(bonus, tank):
 
 
 def get_zones(world):
-    delta = 80.
-    min_x, min_y = delta, delta
-    max_x, max_y = 1280 - delta, 800 - delta
-
-    w_parts_number = int((max_x - min_x) / (2. * constants.ZONE_RADIUS))
-    w_step = (max_x - min_x) / w_parts_number
+    '''zones never change within a game, so they are built once per map'''
+    return utils.get_map_data(world).get('zones',
+            lambda obstacles: [Zone(x, y) for x, y in utils.get_static_map(world).zone_points])
 
-    h_parts_number = int((max_y - min_y) / (2. * constants.ZONE_RADIUS))
-    h_step = (max_y - min_y) / h_parts_number
 
-    base = delta
-    x = y = base
-    res = []
-    while x <= max_x + 1.:
-        while y <= max_y + 1.:
-            append = True
-            for obstacle in world.obstacles:
-                rad = math.hypot(obstacle.width / 2., obstacle.height / 2.) + 30.
-                if math.hypot(x - obstacle.x, y - obstacle.y) < rad:
-                    append = False
-                    break
-            if append:
-                res.append(Zone(x, y))
-            y += h_step
-        y = base
-        x += w_step
-
-    return res
-
-
-def get_fire_strategy_efficientcy(strategy, world):
-    '''strategy: tank -> enemy'''
+def get_fire_efficiency_matrix(teamates, enemies, world):
+    '''eff[i][j] - how fast teamate i damages enemy j, 0. when blocked'''
     def eff(tank, enemy):
         if utils.is_goal_static_blocked_point(tank, enemy, world):
             return 0.
         dp = assessments.damage_probability(tank.x, tank.y, enemy.x, enemy.y)
         return dp / assessments.time_before_hit(tank=tank, target=enemy)
 
-    enemy_to_attackers = defaultdict(list)
-    for t, e in strategy.iteritems():
-        enemy_to_attackers[e].append(t)
+    return [[eff(t, e) for e in enemies] for t in teamates]
 
-    enemy_coeffs = {}
-    for e, attackers in enemy_to_attackers.iteritems():
-        angle = utils.angle_fork(e, attackers)
-        enemy_coeffs[e] = angle_to_coeff(angle)
 
-    res = 0.
-    for t, e in strategy.iteritems():
-        res += eff(t, e) * enemy_coeffs[e]
-    return res
+# angle_to_coeff never exceeds it
+MAX_ANGLE_COEFF = 2.
 
 
-def get_enemy_max_hit(me, world):
+def get_best_fire_strategy(world):
+    '''strategy (tank -> enemy) of the max total efficiency, the efficiency of
+    every teamate is scaled by angle_to_coeff of the fork of its target attackers,
+    empty without enemies
+
+    branch and bound over the efficiency matrix; teamates are summed in the
+    iteration order of a strategy dict and ties go to the strategy enumerated
+    first (teamate 0 is the lowest digit), as with max over all of them
+    '''
     enemies = all_enemies(world)
     teamates = all_teammates(world)
-    strategies = []
     lt = len(teamates)
     le = len(enemies)
-    for i in range(pow(le, lt)):
-        strategy = {}
-        for t_id in range(lt):
-            base = pow(le, t_id)
-            strategy[teamates[t_id]] = enemies[(i / base) % le]
-        strategies.append(strategy)
-
-    best_strategy = max(strategies, key=lambda s: get_fire_strategy_efficientcy(s, world))
+    if le == 0:
+        return {}
+    effs = get_fire_efficiency_matrix(teamates, enemies, world)
+
+    probe = {}
+    for t in teamates:
+        probe[t] = None
+    position = dict((t, i) for i, t in enumerate(teamates))
+    order = [position[t] for t in probe]
+    best_rest = [0.] * (lt + 1)
+    for depth in xrange(lt - 1, -1, -1):
+        best_rest[depth] = best_rest[depth + 1] + MAX_ANGLE_COEFF * max(effs[order[depth]])
+
+    choice = [0] * lt
+    best = [None, None, None]  # score, enumeration index, choice
+
+    def score():
+        attackers = defaultdict(list)
+        for i in order:
+            attackers[choice[i]].append(teamates[i])
+        coeffs = dict((j, angle_to_coeff(utils.angle_fork(enemies[j], tanks)))
+                for j, tanks in attackers.iteritems())
+        res = 0.
+        for i in order:
+            res += effs[i][choice[i]] * coeffs[choice[i]]
+        return res
+
+    def search(depth, partial):
+        if best[0] is not None and partial + best_rest[depth] + 1e-9 < best[0]:
+            return
+        if depth == lt:
+            res = score()
+            index = sum(choice[i] * pow(le, i) for i in xrange(lt))
+            if best[0] is None or res > best[0] or (res == best[0] and index < best[1]):
+                best[:] = [res, index, list(choice)]
+            return
+        i = order[depth]
+        for j in sorted(xrange(le), key=lambda j: -effs[i][j]):
+            choice[i] = j
+            search(depth + 1, partial + MAX_ANGLE_COEFF * effs[i][j])
+
+    search(0, 0.)
+    strategy = {}
+    for i, t in enumerate(teamates):
+        strategy[t] = enemies[best[2][i]]
+    return strategy
+
+
+def get_enemy_max_hit(me, world):
+    '''None without enemies'''
+    enemies = all_enemies(world)
+    if not enemies:
+        return None
+    best_strategy = utils.get_tick_context(world).memoize('best_fire_strategy', get_best_fire_strategy, world)
     for t, e in best_strategy.iteritems():
         if t.id == me.id:
             return e
@@ -157,6 +179,7 @@ def get_enemy_max_score(me, world):
 
 
 def get_enemy(me, world):
+    '''None without enemies'''
     if utils.alive_team_number(world) > 2:
         return get_enemy_max_score(me, world)
     return get_enemy_max_hit(me, world)
@@ -267,7 +290,7 @@ def move_to_unit(goal, me, world, move):
     if math.hypot(goal.x - me.x, goal.y - me.y) < min_dist:
         return False
 
-    x, y = goal.x, goal.y
+    x, y = utils.get_navigation(world).waypoint(me.x, me.y, goal.x, goal.y)
     min_angle = math.pi / 6
 
     angle = me.get_angle_to(x, y)
@@ -296,14 +319,11 @@ def move_to_unit(goal, me, world, move):
 
 # return True if shell path crossed me
 def is_shell_dangerous(me, shell, world):
-    vs_x = shell.speedX
-    vs_y = shell.speedY
     speed_mod = math.hypot(shell.speedX, shell.speedY)
     if speed_mod < 0.001:
         return False
 
-    dist_x = shell.x + vs_x * 1000
-    dist_y = shell.y + vs_y * 1000
+    dist_x, dist_y = prediction.get_shell_path_ends(world)[shell.id]
 
     next_shell = Unit(shell.id, width=shell.width, height=shell.height,
             x=dist_x, y=dist_y,
@@ -449,13 +469,17 @@ def new_best_avoid_shells(shells, me, world, move):
             (-1., 0.75),
             ]
 
-    def damage(s):
+    # one trajectory per strategy, shared by all the shells
+    rollout = prediction.Rollout(me, world, strategies)
+
+    def damage(index):
+        s = strategies[index]
         res = 0.
         for shell in shells:
-            res += prediction.damage(me, shell, world, s[0], s[1])
+            res += prediction.damage(me, shell, world, s[0], s[1], rollout, index)
         return res
 
-    strategy = min(strategies, key=lambda s: damage(s))
+    strategy = strategies[min(xrange(len(strategies)), key=damage)]
     move.left_track_power = strategy[0]
     move.right_track_power = strategy[1]
     # print world.tick, ":", stategy[0], stategy[1], \
@@ -482,8 +506,8 @@ def avoid_shells(me, world, move):
     return new_best_avoid_shells(shells_to_avoid, me, world, move)
 
 
-def get_bonus_rating(me, bonus):
-    time = assessments.time_to_get(me, bonus)
+def get_bonus_rating(me, bonus, world):
+    time = assessments.time_to_get(me, bonus, world)
     if time < 0.01:
         time = 0.01
     return get_bonus_factor(me, bonus) / time
@@ -498,27 +522,293 @@ def angle_to_coeff(angle):
     return 1. + angle / limit
 
 
-def get_best_zone(me, world):
+def team_addition_value(distance):
+    # 0 -> -2.
+    # norm -> 0.
+    # max -> -1.
+    min_norm_dist = 120
+    max_norm_dist = 400
+    max_dist = 1000
+    if distance < min_norm_dist:
+        return (2. * distance) / float(min_norm_dist) - 2.
+    elif min_norm_dist <= distance <= max_norm_dist:
+        return 0.
+    else:
+        return (max_norm_dist - distance) / (max_dist - max_norm_dist)
+
+
+def blocker_coeff(tank, goal, blocker):
+    if blocker is None:
+        return 1.
+    blocker_rad = math.hypot(blocker.width / 2., blocker.height / 2.)
+    nx, ny = geometry.get_nearest_point(tank.x, tank.y, goal.x, goal.y, blocker.x, blocker.y)
+    dist = math.hypot(blocker.x - nx, blocker.y - ny)
+    if dist > blocker_rad:
+        return 1.
+    return dist / blocker_rad
+
+
+def enemy_addition_value(distance):
+    min_dist = 90.
+    if distance > min_dist:
+        return 0.
+    return -2. + (2. * distance) / min_dist
+
+
+def fire_factors(tx, ty, target, world):
+    '''(damage probability, blocker coeff) of a shot from (tx, ty) to target'''
+    dp = assessments.damage_probability(tx, ty, target.x, target.y)
+    blocker = utils.get_static_blocker_point(Point(tx, ty), target, world)
+    return dp, blocker_coeff(Point(tx, ty), target, blocker)
+
+
+def single_damage_value(tank, target, world, tx=None, ty=None):
+    if tx is None:
+        tx = tank.x
+    if ty is None:
+        ty = tank.y
+    power = assessments.get_power(tank)
+    dp, bc = fire_factors(tx, ty, target, world)
+    return power * dp * bc
+
+
+# a layer is recomputed once its enemy moved farther than this from where it was computed,
+# zones are 2 * ZONE_RADIUS apart
+ZONE_LAYER_MOVE_LIMIT = 10.
+# moves behind all the reused layers add up to the error, beyond it every layer is recomputed
+ZONE_FIELD_ERROR_LIMIT = 20.
+# blocker coeff of a shot the sight table can not prove clear
+COARSE_BLOCKED_COEFF = 0.5
+
+
+class EnemyLayer:
+    '''zone lattice values of one enemy standing at (x, y), filled on first use
+    addition - enemy_addition_value of the zone
+    probability - damage probability between the zone and the enemy
+    blocking_from, blocking_to - blocker coeff of a shot from the enemy to the zone and back
+    sight_addition, sight_probability, sight_blocking - values of the coarse pass, filled
+    by fill_sight into buffers of their own, blocker coeff is estimated with the sight table
+    '''
+    def __init__(self, enemy, size):
+        self.x = enemy.x
+        self.y = enemy.y
+        self.known = bytearray(size)
+        self.sight_known = bytearray(size)
+        self.addition = array('d', [0.]) * size
+        self.probability = array('d', [0.]) * size
+        self.blocking_from = array('d', [0.]) * size
+        self.blocking_to = array('d', [0.]) * size
+        self.sight_addition = array('d', [0.]) * size
+        self.sight_probability = array('d', [0.]) * size
+        self.sight_blocking = array('d', [0.]) * size
+
+    def fill(self, zone, index, world):
+        self.addition[index] = enemy_addition_value(math.hypot(zone.x - self.x, zone.y - self.y))
+        dp, bc = fire_factors(self.x, self.y, Point(zone.x, zone.y), world)
+        self.probability[index] = dp
+        self.blocking_from[index] = bc
+        self.blocking_to[index] = fire_factors(zone.x, zone.y, Point(self.x, self.y), world)[1]
+        self.known[index] = 1
+
+    def fill_sight(self, zone, index, sight):
+        self.sight_addition[index] = enemy_addition_value(math.hypot(zone.x - self.x, zone.y - self.y))
+        self.sight_probability[index] = assessments.damage_probability(self.x, self.y, zone.x, zone.y)
+        # the sight table is symmetric, so are the shots both ways
+        clear = sight.is_clear(zone.x, zone.y, self.x, self.y)
+        self.sight_blocking[index] = 1. if clear else COARSE_BLOCKED_COEFF
+        self.sight_known[index] = 1
+
+
+class ZoneField:
+    '''enemy layers kept between ticks
+
+    power is applied on every tick, so only the enemies that moved past
+    ZONE_LAYER_MOVE_LIMIT get new layers; dead tanks change blockers,
+    a new map changes zones and a new game on the same map starts the ticks
+    over, all of them rebuild every layer
+    '''
+    def __init__(self):
+        self.zones = None
+        self.dead_ids = None
+        self.tick = None
+        self.layers = {}
+
+    def update(self, world, zones, enemies):
+        dead_ids = frozenset(t.id for t in utils.get_tank_lists(world).dead_tanks)
+        new_game = self.tick is not None and world.tick < self.tick
+        if new_game or zones is not self.zones or dead_ids != self.dead_ids:
+            self.zones = zones
+            self.dead_ids = dead_ids
+            self.layers = {}
+        self.tick = world.tick
+
+        layers = {}
+        error = 0.
+        for e in enemies:
+            layer = self.layers.get(e.id)
+            if layer is not None:
+                move = math.hypot(e.x - layer.x, e.y - layer.y)
+                if move <= ZONE_LAYER_MOVE_LIMIT:
+                    layers[e.id] = layer
+                    error += move
+        if error > ZONE_FIELD_ERROR_LIMIT:
+            layers = {}
+
+        for e in enemies:
+            if e.id not in layers:
+                layers[e.id] = EnemyLayer(e, len(zones))
+        self.layers = layers
+        return [layers[e.id] for e in enemies]
+
+
+def get_zone_field(world):
+    return utils.get_map_data(world).get('zone_field', lambda obstacles: ZoneField())
+
+
+class InfluenceMap:
+    '''tick-level layers over the zone lattice, indexed like get_zones
+    crowding - enemy_addition of the zone
+    threat - damage the enemy team can hit to a tank in the zone
+    fire_probability[j], fire_blocking[j] - shot factors from the zone to enemy j
+    per enemy values come from the ZoneField, zones are filled on first use,
+    fill_all fills the whole lattice; coarse_factors are cheap estimates
+    of the same values for a coarse search
+    '''
+    def __init__(self, world):
+        self.world = world
+        self.zones = get_zones(world)
+        self.enemies = all_enemies(world)
+        self.layers = get_zone_field(world).update(world, self.zones, self.enemies)
+        self.powers = [assessments.get_power(e) for e in self.enemies]
+        size = len(self.zones)
+        self.known = bytearray(size)
+        self.crowding = array('d', [0.]) * size
+        self.threat = array('d', [0.]) * size
+        self.fire_probability = [layer.probability for layer in self.layers]
+        self.fire_blocking = [layer.blocking_to for layer in self.layers]
+        self.threats = {}
+        self.team_damages = {}
+        self.coarse = {}
+
+    def threat_at(self, x, y):
+        '''damage that enemy team can hit to tank in (x, y)'''
+        key = (x, y)
+        res = self.threats.get(key)
+        if res is None:
+            res = 0.
+            angle_fork = utils.angle_fork(Point(x, y), self.enemies)
+            for e in self.enemies:
+                res += single_damage_value(e, Point(x, y), self.world)
+            res = res * angle_to_coeff(angle_fork)
+            self.threats[key] = res
+        return res
+
+    def team_damage(self, tank, enemy_index):
+        '''single damage value of a teamate staying where it is'''
+        key = (tank.id, enemy_index)
+        res = self.team_damages.get(key)
+        if res is None:
+            e = self.enemies[enemy_index]
+            res = single_damage_value(tank, Point(e.x, e.y), self.world)
+            self.team_damages[key] = res
+        return res
+
+    def coarse_factors(self, index):
+        '''(crowding, threat, fire) of the zone with blockers taken from the sight table,
+        fire[j] - (damage probability, blocker coeff) of a shot from the zone to enemy j
+        '''
+        res = self.coarse.get(index)
+        if res is None:
+            zone = self.zones[index]
+            crowding = 0
+            threat = 0.
+            fire = []
+            for power, layer in zip(self.powers, self.layers):
+                if not layer.sight_known[index]:
+                    layer.fill_sight(zone, index, utils.get_sight_table(self.world))
+                crowding += layer.sight_addition[index]
+                threat += power * layer.sight_probability[index] * layer.sight_blocking[index]
+                fire.append((layer.sight_probability[index], layer.sight_blocking[index]))
+            coeff = angle_to_coeff(utils.angle_fork(zone, self.enemies))
+            res = (crowding * coeff, threat * coeff, fire)
+            self.coarse[index] = res
+        return res
+
+    def fill(self, indices):
+        for index in indices:
+            if self.known[index]:
+                continue
+            zone = self.zones[index]
+            for layer in self.layers:
+                if not layer.known[index]:
+                    layer.fill(zone, index, self.world)
+            coeff = angle_to_coeff(utils.angle_fork(zone, self.enemies))
+            crowding = 0
+            threat = 0.
+            for power, layer in zip(self.powers, self.layers):
+                crowding += layer.addition[index]
+                threat += power * layer.probability[index] * layer.blocking_from[index]
+            self.crowding[index] = crowding * coeff
+            self.threat[index] = threat * coeff
+            self.known[index] = 1
+
+    def fill_all(self):
+        self.fill(xrange(len(self.zones)))
+
+    def dump(self, path):
+        '''tab separated layers of the whole lattice, a line per zone'''
+        self.fill_all()
+        with open(path, 'w') as out:
+            out.write('x\ty\tcrowding\tthreat')
+            for e in self.enemies:
+                out.write('\tprobability_{0}\tblocking_{0}'.format(e.id))
+            out.write('\n')
+            for index, zone in enumerate(self.zones):
+                out.write('{0:.1f}\t{1:.1f}\t{2:.4f}\t{3:.4f}'.format(
+                        zone.x, zone.y, self.crowding[index], self.threat[index]))
+                for j in xrange(len(self.enemies)):
+                    out.write('\t{0:.4f}\t{1:.4f}'.format(
+                            self.fire_probability[j][index], self.fire_blocking[j][index]))
+                out.write('\n')
+
+
+def get_influence_map(world):
+    return utils.get_tick_context(world).memoize('influence_map', InfluenceMap, world)
+
+
+# coarse lattice keeps a zone per cell of this size
+COARSE_ZONE_CELL = constants.ZONE_RADIUS * 4.
+# best coarse zones refined with the full value
+COARSE_CANDIDATES = 2
+NEIGHBOUR_RADIUS = constants.ZONE_RADIUS * 2 * 1.6
+# a candidate and its four neighbours
+REFINE_RADIUS = constants.ZONE_RADIUS * 2 * 1.1
+
+
+def build_coarse_zone_indices(zones):
+    '''first zone of every COARSE_ZONE_CELL cell'''
+    cells = {}
+    for index, zone in enumerate(zones):
+        cells.setdefault((int(zone.x / COARSE_ZONE_CELL), int(zone.y / COARSE_ZONE_CELL)), index)
+    return sorted(cells.itervalues())
+
+
+def get_coarse_zone_indices(world):
     zones = get_zones(world)
-    neighbour_zones = filter(lambda z: me.get_distance_to(z.x, z.y) < constants.ZONE_RADIUS * 2 * 1.6,
-            zones)
-    enemies = all_enemies(world)
+    return utils.get_map_data(world).get('coarse_zone_indices',
+            lambda obstacles: build_coarse_zone_indices(zones))
+
+
+def get_best_zone(me, world):
+    '''zones near me and near the best zones of a coarse pass over the whole map
+    are rated with the full value'''
+    influence = get_influence_map(world)
+    zones = influence.zones
+    enemies = influence.enemies
     team_power = get_team_power(world)
     team = all_teammates_without_me(world, me)
-
-    def team_addition_value(distance):
-        # 0 -> -2.
-        # norm -> 0.
-        # max -> -1.
-        min_norm_dist = 120
-        max_norm_dist = 400
-        max_dist = 1000
-        if distance < min_norm_dist:
-            return (2. * distance) / float(min_norm_dist) - 2.
-        elif min_norm_dist <= distance <= max_norm_dist:
-            return 0.
-        else:
-            return (max_norm_dist - distance) / (max_dist - max_norm_dist)
+    my_power = assessments.get_power(me)
+    team_threat = [influence.threat_at(t.x, t.y) / utils.life_factor(t) for t in team]
 
     def team_addition(zone):
         res = 0
@@ -526,96 +816,80 @@ def get_best_zone(me, world):
             res += team_addition_value(math.hypot(zone.x - t.x, zone.y - t.y))
         return res
 
-    def blocker_coeff(tank, goal, blocker):
-        if blocker is None:
-            return 1.
-        blocker_rad = math.hypot(blocker.width / 2., blocker.height / 2.)
-        nx, ny = geometry.get_nearest_point(tank.x, tank.y, goal.x, goal.y, blocker.x, blocker.y)
-        dist = math.hypot(blocker.x - nx, blocker.y - ny)
-        if dist > blocker_rad:
-            return 1.
-        return dist / blocker_rad
-
-    def enemy_addition_value(distance):
-        min_dist = 90.
-        if distance > min_dist:
-            return 0.
-        return -2. + (2. * distance) / min_dist
+    def neighbours(center, radius):
+        return [i for i, z in enumerate(zones) if math.hypot(center.x - z.x, center.y - z.y) < radius]
 
-    def enemy_addition(zone):
-        res = 0
-        for e in enemies:
-            res += enemy_addition_value(math.hypot(zone.x - e.x, zone.y - e.y))
-        coef = angle_to_coeff(utils.angle_fork(zone, enemies))
-        return res * coef
-
-    def single_damage_value(tank, target, tx=None, ty=None):
-        if tx is None:
-            tx = tank.x
-        if ty is None:
-            ty = tank.y
-        power = assessments.get_power(tank)
-        dp = assessments.damage_probability(tx, ty, target.x, target.y)
-        blocker = utils.get_static_blocker_point(Point(tx, ty), target, world)
-        bc = blocker_coeff(Point(tx, ty), target, blocker)
-        return power * dp * bc
-
-    def damage_value(x, y):
-        '''damage that enemy team can hit to tank in (x, y)'''
-        res = 0.
-        angle_fork = utils.angle_fork(Point(x, y), enemies)
-        for e in enemies:
-            res += single_damage_value(e, Point(x, y))
-        return res * angle_to_coeff(angle_fork)
+    indices = neighbours(me, NEIGHBOUR_RADIUS)
+    if not enemies:
+        # nothing to fight, keep to the team and move as little as possible
+        return zones[max(indices, key=lambda i: (team_addition(zones[i]),
+                -math.hypot(zones[i].x - me.x, zones[i].y - me.y)))]
 
-    def damage(zone):
-        '''damage that our team can get if me in zone'''
-        dv = damage_value(zone.x, zone.y) / utils.life_factor(me)
-        for t in team:
-            team_dv = damage_value(t.x, t.y) / utils.life_factor(t)
+    def damage(threat):
+        '''damage that our team can get if me in zone with threat'''
+        dv = threat / utils.life_factor(me)
+        for team_dv in team_threat:
             dv = max(team_dv, dv)
         return dv
-        # res = 0
-        # for e in enemies:
-        #     my_damage_prob = damage_probability(e.x, e.y, zone.x, zone.y)
-        #     if len(team) > 0:
-        #         best_team_target = max(team, key=lambda t: damage_probability(e.x, e.y, t.x, t.y))
-        #         if damage_probability(e.x, e.y, best_team_target.x, best_team_target.y) > my_damage_prob:
-        #             continue
-
-        #     res += get_power(e) * my_damage_prob
-        # return res
-
-    def my_damage_value(x, y, ex, ey):
-        '''damage that our team can heat to enemy in (ex, ey) if me in (x, y)'''
-        res = single_damage_value(me, Point(ex, ey), x, y)
-        angle_fork = utils.angle_fork(Point(ex, ey), [Point(x, y)] + team)
+
+    def my_damage_value(zone, j, dp, bc):
+        '''damage that our team can heat to enemy j if me in zone'''
+        e = enemies[j]
+        res = my_power * dp * bc
+        angle_fork = utils.angle_fork(Point(e.x, e.y), [Point(zone.x, zone.y)] + team)
         for t in team:
-            res += single_damage_value(t, Point(ex, ey))
+            res += influence.team_damage(t, j)
         return res * angle_to_coeff(angle_fork)
 
-    def my_damage(zone):
-        '''damage that our team can heat if me in (x, y)'''
-        target = max(enemies, key=lambda e: my_damage_value(zone.x, zone.y, e.x, e.y) / utils.life_factor(e))
-        return my_damage_value(zone.x, zone.y, target.x, target.y)
-        # target = max(enemies, key=lambda e: damage_probability(zone.x, zone.y, e.x, e.y))
-        # res = get_power(me) * damage_probability(zone.x, zone.y, target.x, target.y)
-        # angle_fork = utils.angle_fork(target, [zone] + team)
-        # coef = angle_to_coeff(angle_fork)
-        # return res * coef
+    def my_damage(zone, fire):
+        '''damage that our team can heat if me in zone
+        fire[j] - (damage probability, blocker coeff) of a shot from zone to enemy j
+        '''
+        values = [my_damage_value(zone, j, dp, bc) for j, (dp, bc) in enumerate(fire)]
+        target = max(xrange(len(enemies)), key=lambda j: values[j] / utils.life_factor(enemies[j]))
+        return values[target]
 
-
-    def value(zone):
+    def rate(zone, crowding, threat, fire):
         enemy_power = 1 - team_power
-        return enemy_addition(zone) + \
+        return crowding + \
                 0.3 * team_addition(zone) + \
-                1.1 * team_power * my_damage(zone) - \
-                enemy_power * damage(zone)
-
-
-    res = max(neighbour_zones, key=lambda z: value(z))
+                1.1 * team_power * my_damage(zone, fire) - \
+                enemy_power * damage(threat)
+
+    def value(index):
+        fire = [(influence.fire_probability[j][index], influence.fire_blocking[j][index])
+                for j in xrange(len(enemies))]
+        return rate(zones[index], influence.crowding[index], influence.threat[index], fire)
+
+    # damage of the teamates and the weight of enemy j for coarse_value
+    team_damages = [sum(influence.team_damage(t, j) for t in team) for j in xrange(len(enemies))]
+    enemy_weights = [1. / utils.life_factor(e) for e in enemies]
+
+    def coarse_value(index):
+        '''value without angle forks of our shots'''
+        crowding, threat, fire = influence.coarse_factors(index)
+        best = 0.
+        for (dp, bc), team_damage, weight in zip(fire, team_damages, enemy_weights):
+            best = max(best, (my_power * dp * bc + team_damage) * weight)
+        return crowding + \
+                0.3 * team_addition(zones[index]) + \
+                1.1 * team_power * best - \
+                (1 - team_power) * damage(threat)
+
+    # a region is refined only when the coarse pass rates it above every zone near me
+    local_best = max([coarse_value(index) for index in indices] or [None])
+    refined = set(indices)
+    coarse_values = [(coarse_value(index), index) for index in get_coarse_zone_indices(world)]
+    for coarse, index in heapq.nlargest(COARSE_CANDIDATES, coarse_values):
+        if coarse <= local_best:
+            break
+        refined.update(neighbours(zones[index], REFINE_RADIUS))
+    indices = sorted(refined)
+    influence.fill(indices)
+
+    res = zones[max(indices, key=value)]
     # if world.tick == 270:
-    #     print_zones(me, world, value)
+    #     influence.dump('influence_{0}.txt'.format(world.tick))
     return res
 
 
@@ -626,10 +900,11 @@ def get_strategic_goal(me, world):
     usefull_bonuses = filter(lambda b: assessments.is_bonus_usefull(me, b, world), world.bonuses)
     for teammate in team:
         usefull_bonuses = filter(
-                lambda b: get_bonus_rating(me, b) > get_bonus_rating(teammate, b), usefull_bonuses)
+                lambda b: get_bonus_rating(me, b, world) > get_bonus_rating(teammate, b, world),
+                usefull_bonuses)
 
     if len(usefull_bonuses) > 0:
-        bonus = max(usefull_bonuses, key=lambda b: get_bonus_rating(me, b))
+        bonus = max(usefull_bonuses, key=lambda b: get_bonus_rating(me, b, world))
         return make_zone(bonus, me)
 
     return get_best_zone(me, world)
@@ -758,8 +1033,8 @@ class MyStrategy:
         begin = time.time()
 
         enemy = get_enemy(me, world)
-
-        fire_to(enemy, me, world, move)
+        if enemy is not None:
+            fire_to(enemy, me, world, move)
 
         if not avoid_shells(me, world, move):
             if not avoid_possible_shells(me, world, move):
@@ -1,15 +1,8 @@
 import socket
 import struct
-from model.Bonus import Bonus
-from model.BonusType import BonusType
-from model.Obstacle import Obstacle
-from model.Player import Player
-from model.PlayerContext import PlayerContext
-from model.Shell import Shell
-from model.ShellType import ShellType
-from model.Tank import Tank
-from model.TankType import TankType
-from model.World import World
+
+import codec
+from WireRecording import RecordingSocket
 
 class RemoteProcessClient:
     LITTLE_ENDIAN_BYTE_ORDER = True
@@ -24,189 +17,115 @@ class RemoteProcessClient:
     LONG_SIZE_BYTES = 8
     DOUBLE_SIZE_BYTES = 8
 
-    def __init__(self, host, port):
-        self.socket = socket.socket()
-        self.socket.connect((host, port))
+    SIGNED_BYTE_STRUCT = struct.Struct(SIGNED_BYTE_FORMAT_STRING)
+    INTEGER_STRUCT = struct.Struct(INTEGER_FORMAT_STRING)
+    LONG_STRUCT = struct.Struct(LONG_FORMAT_STRING)
+    DOUBLE_STRUCT = struct.Struct(DOUBLE_FORMAT_STRING)
+
+    BUFFER_SIZE_BYTES = 1 << 16
+
+    def __init__(self, host, port, transport=None):
+        '''transport replaces the socket, e.g. WireRecording.ReplaySocket'''
+        if transport is None:
+            transport = socket.socket()
+            transport.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport.connect((host, port))
+
+        self.socket = transport
+        self.recording_socket = None
+        self.init_buffers()
+
+    def start_recording(self, path):
+        self.recording_socket = RecordingSocket(self.socket, path)
+        self.socket = self.recording_socket
+
+    def init_buffers(self):
+        self.buffer = bytearray(RemoteProcessClient.BUFFER_SIZE_BYTES)
+        self.buffer_view = memoryview(self.buffer)
+        self.buffer_offset = 0
+        self.buffer_end = 0
+        self.buffer_mark = None
+
+        self.output_buffer = bytearray(RemoteProcessClient.BUFFER_SIZE_BYTES)
+        self.output_end = 0
 
     def write_token(self, token):
         self.write_enum(RemoteProcessClient.MessageType.AUTHENTICATION_TOKEN)
-        self.write_string(token)
+        codec.AUTHENTICATION_TOKEN.write(self, token)
+        self.flush()
 
     def read_team_size(self):
         message_type = self.read_enum(RemoteProcessClient.MessageType)
         self.ensure_message_type(message_type, RemoteProcessClient.MessageType.TEAM_SIZE)
-        return self.read_int()
+        team_size = codec.TEAM_SIZE.read(self)
+        self.end_inbound_message()
+        return team_size
 
     def write_selected_tanks(self, tank_types):
         self.write_enum(RemoteProcessClient.MessageType.TANK_TYPES)
-
-        if tank_types is None:
-            self.write_int(-1)
-        else:
-            self.write_int(tank_types.__len__())
-
-            for type in tank_types:
-                self.write_enum(type)
+        codec.TANK_TYPES.write(self, tank_types)
+        self.flush()
 
     def read_player_context(self):
         message_type = self.read_enum(RemoteProcessClient.MessageType)
         if message_type == RemoteProcessClient.MessageType.GAME_OVER:
+            self.end_inbound_message()
             return None
 
         self.ensure_message_type(message_type, RemoteProcessClient.MessageType.PLAYER_CONTEXT)
-        return PlayerContext(self.read_tanks(), self.read_world()) if self.read_boolean() else None
+        player_context = codec.PLAYER_CONTEXT.read(self)
+        self.end_inbound_message()
+        return player_context
 
     def write_moves(self, moves):
         self.write_enum(RemoteProcessClient.MessageType.MOVES)
+        codec.MOVES.write(self, moves)
+        self.flush()
 
-        if moves is None:
-            self.write_int(-1)
-        else:
-            self.write_int(moves.__len__())
-
-            for move in moves:
-                if move is None:
-                    self.write_boolean(False)
-                else:
-                    self.write_boolean(True)
-
-                    self.write_double(move.left_track_power)
-                    self.write_double(move.right_track_power)
-                    self.write_double(move.turret_turn)
-                    self.write_enum(move.fire_type)
+    def end_inbound_message(self):
+        if self.recording_socket is not None:
+            self.recording_socket.end_frame(self.buffer_end - self.buffer_offset)
 
     def close(self):
         self.socket.close()
 
     def read_world(self):
-        if not self.read_boolean():
-            return None
-
-        return World(
-            self.read_int(), self.read_double(), self.read_double(), self.read_players(),
-            self.read_obstacles(), self.read_tanks(), self.read_shells(), self.read_bonuses()
-        )
+        return codec.OPTIONAL_WORLD.read(self)
 
     def read_players(self):
-        player_count = self.read_int()
-        if player_count < 0:
-            return None
-
-        players = []
-
-        for player_index in xrange(player_count):
-            if self.read_boolean():
-                player = Player(self.read_string(), self.read_int(), self.read_boolean())
-                players.append(player)
-            else:
-                players.append(None)
-
-        return players
+        return codec.PLAYERS.read(self)
 
     def read_obstacles(self):
-        obstacle_count = self.read_int()
-        if obstacle_count < 0:
-            return None
-
-        obstacles = []
-
-        for obstacle_index in xrange(obstacle_count):
-            if self.read_boolean():
-                obstacle = Obstacle(
-                    self.read_long(), self.read_double(), self.read_double(),
-                    self.read_double(), self.read_double()
-                )
-                obstacles.append(obstacle)
-            else:
-                obstacles.append(None)
-
-        return obstacles
+        return codec.OBSTACLES.read(self)
 
     def read_tanks(self):
-        tank_count = self.read_int()
-        if tank_count < 0:
-            return None
-
-        tanks = []
-
-        for tank_index in xrange(tank_count):
-            if self.read_boolean():
-                tank = Tank(
-                    self.read_long(), self.read_string(), self.read_int(),
-                    self.read_double(), self.read_double(), self.read_double(), self.read_double(),
-                    self.read_double(), self.read_double(), self.read_double(),
-                    self.read_int(), self.read_int(), self.read_int(), self.read_int(),
-                    self.read_int(), self.read_boolean(), self.read_enum(TankType)
-                )
-                tanks.append(tank)
-            else:
-                tanks.append(None)
-
-        return tanks
+        return codec.TANKS.read(self)
 
     def read_shells(self):
-        shell_count = self.read_int()
-        if shell_count < 0:
-            return None
-
-        shells = []
-
-        for shell_index in xrange(shell_count):
-            if self.read_boolean():
-                shell = Shell(
-                    self.read_long(), self.read_string(), self.read_double(), self.read_double(),
-                    self.read_double(), self.read_double(), self.read_double(), self.read_double(),
-                    self.read_double(), self.read_double(), self.read_enum(ShellType)
-                )
-                shells.append(shell)
-            else:
-                shells.append(None)
-
-        return shells
+        return codec.SHELLS.read(self)
 
     def read_bonuses(self):
-        bonus_count = self.read_int()
-        if bonus_count < 0:
-            return None
-
-        bonuses = []
-
-        for bonus_index in xrange(bonus_count):
-            if self.read_boolean():
-                bonus = Bonus(
-                    self.read_long(), self.read_double(), self.read_double(),
-                    self.read_double(), self.read_double(), self.read_enum(BonusType)
-                )
-                bonuses.append(bonus)
-            else:
-                bonuses.append(None)
-
-        return bonuses
+        return codec.BONUSES.read(self)
 
     def ensure_message_type(self, actual_type, expected_type):
         if actual_type != expected_type:
             raise ValueError("Received wrong message [actual=%s, expected=%s]" % (actual_type, expected_type))
 
     def read_enum(self, enum_class):
-        bytes = self.read_bytes(RemoteProcessClient.SIGNED_BYTE_SIZE_BYTES)
-        value = struct.unpack(RemoteProcessClient.SIGNED_BYTE_FORMAT_STRING, bytes)[0]
-
-        for enum_key, enum_value in enum_class.__dict__.iteritems():
-            if not str(enum_key).startswith("__") and value == enum_value:
-                return enum_value
-
-        return None
+        return codec.enum_table(enum_class).get(self.read_struct(RemoteProcessClient.SIGNED_BYTE_STRUCT)[0])
 
     def write_enum(self, value):
-        self.write_bytes(struct.pack(RemoteProcessClient.SIGNED_BYTE_FORMAT_STRING, -1 if value is None else value))
+        self.write_struct(RemoteProcessClient.SIGNED_BYTE_STRUCT, (-1 if value is None else value,))
 
     def read_string(self):
         length = self.read_int()
         if length == -1:
             return None
 
-        bytes = self.read_bytes(length)
-        return bytes.decode("utf-8")
+        self.fill_buffer(length)
+        offset = self.buffer_offset
+        self.buffer_offset += length
+        return self.buffer[offset:offset + length].decode("utf-8")
 
     def write_string(self, value):
         if value is None:
@@ -219,48 +138,104 @@ class RemoteProcessClient:
         self.write_bytes(bytes)
 
     def read_boolean(self):
-        bytes = self.read_bytes(RemoteProcessClient.SIGNED_BYTE_SIZE_BYTES)
-        return struct.unpack(RemoteProcessClient.SIGNED_BYTE_FORMAT_STRING, bytes)[0] == 1
+        return self.read_struct(RemoteProcessClient.SIGNED_BYTE_STRUCT)[0] == 1
 
     def write_boolean(self, value):
-        self.write_bytes(struct.pack(RemoteProcessClient.SIGNED_BYTE_FORMAT_STRING, 1 if value else 0))
+        self.write_struct(RemoteProcessClient.SIGNED_BYTE_STRUCT, (1 if value else 0,))
 
     def read_int(self):
-        bytes = self.read_bytes(RemoteProcessClient.INTEGER_SIZE_BYTES)
-        return struct.unpack(RemoteProcessClient.INTEGER_FORMAT_STRING, bytes)[0]
+        return self.read_struct(RemoteProcessClient.INTEGER_STRUCT)[0]
 
     def write_int(self, value):
-        self.write_bytes(struct.pack(RemoteProcessClient.INTEGER_FORMAT_STRING, value))
+        self.write_struct(RemoteProcessClient.INTEGER_STRUCT, (value,))
 
     def read_long(self):
-        bytes = self.read_bytes(RemoteProcessClient.LONG_SIZE_BYTES)
-        return struct.unpack(RemoteProcessClient.LONG_FORMAT_STRING, bytes)[0]
+        return self.read_struct(RemoteProcessClient.LONG_STRUCT)[0]
 
     def write_long(self, value):
-        self.write_bytes(struct.pack(RemoteProcessClient.LONG_FORMAT_STRING, value))
+        self.write_struct(RemoteProcessClient.LONG_STRUCT, (value,))
 
     def read_double(self):
-        bytes = self.read_bytes(RemoteProcessClient.DOUBLE_SIZE_BYTES)
-        return struct.unpack(RemoteProcessClient.DOUBLE_FORMAT_STRING, bytes)[0]
+        return self.read_struct(RemoteProcessClient.DOUBLE_STRUCT)[0]
 
     def write_double(self, value):
-        self.write_bytes(struct.pack(RemoteProcessClient.DOUBLE_FORMAT_STRING, value))
+        self.write_struct(RemoteProcessClient.DOUBLE_STRUCT, (value,))
+
+    def read_struct(self, compiled_struct):
+        self.fill_buffer(compiled_struct.size)
+        values = compiled_struct.unpack_from(self.buffer, self.buffer_offset)
+        self.buffer_offset += compiled_struct.size
+        return values
+
+    def write_struct(self, compiled_struct, values):
+        self.reserve_output(compiled_struct.size)
+        compiled_struct.pack_into(self.output_buffer, self.output_end, *values)
+        self.output_end += compiled_struct.size
 
     def read_bytes(self, byte_count):
-        bytes = ''
+        self.fill_buffer(byte_count)
+        offset = self.buffer_offset
+        self.buffer_offset += byte_count
+        return str(self.buffer[offset:offset + byte_count])
+
+    def skip_bytes(self, byte_count):
+        self.fill_buffer(byte_count)
+        self.buffer_offset += byte_count
+
+    def mark_buffer(self):
+        '''bytes from here on stay buffered until take_marked'''
+        self.buffer_mark = self.buffer_offset
+
+    def take_marked(self):
+        bytes = str(self.buffer[self.buffer_mark:self.buffer_offset])
+        self.buffer_mark = None
+        return bytes
 
-        while len(bytes) < byte_count:
-            chunk = self.socket.recv(byte_count - len(bytes))
+    def fill_buffer(self, byte_count):
+        '''make sure at least byte_count unread bytes are buffered
+        reads as much as the socket has, so one recv usually covers a whole message
+        '''
+        if self.buffer_end - self.buffer_offset >= byte_count:
+            return
 
-            if not len(chunk):
+        keep_from = self.buffer_offset if self.buffer_mark is None else self.buffer_mark
+        kept_byte_count = self.buffer_end - keep_from
+        required_byte_count = self.buffer_offset - keep_from + byte_count
+        if required_byte_count > len(self.buffer):
+            buffer = bytearray(max(required_byte_count, 2 * len(self.buffer)))
+            buffer[:kept_byte_count] = self.buffer[keep_from:self.buffer_end]
+            self.buffer = buffer
+            self.buffer_view = memoryview(buffer)
+        elif keep_from:
+            self.buffer[:kept_byte_count] = self.buffer[keep_from:self.buffer_end]
+
+        self.buffer_offset -= keep_from
+        self.buffer_end = kept_byte_count
+        if self.buffer_mark is not None:
+            self.buffer_mark = 0
+
+        while self.buffer_end < self.buffer_offset + byte_count:
+            chunk_size = self.socket.recv_into(self.buffer_view[self.buffer_end:])
+
+            if not chunk_size:
                 raise IOError("Can't read %s bytes from input stream." % str(byte_count))
 
-            bytes += chunk
-
-        return bytes
+            self.buffer_end += chunk_size
 
     def write_bytes(self, bytes):
-        self.socket.sendall(bytes)
+        self.reserve_output(len(bytes))
+        self.output_buffer[self.output_end:self.output_end + len(bytes)] = bytes
+        self.output_end += len(bytes)
+
+    def reserve_output(self, byte_count):
+        if self.output_end + byte_count > len(self.output_buffer):
+            self.output_buffer.extend(bytearray(max(byte_count, len(self.output_buffer))))
+
+    def flush(self):
+        '''send everything written since the last flush with a single sendall'''
+        if self.output_end:
+            self.socket.sendall(memoryview(self.output_buffer)[:self.output_end])
+            self.output_end = 0
 
     class MessageType:
         UNKNOWN = 0
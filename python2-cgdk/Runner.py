@@ -1,17 +1,39 @@
 import sys
+import time
 from MyStrategy import MyStrategy
 from RemoteProcessClient import RemoteProcessClient
+from WireRecording import ReplaySocket, read_frames
 from model.Move import Move
 
 class Runner:
+    '''usage: Runner.py [host port token] [--record path | --replay path]
+    --record saves the inbound stream, --replay plays a saved one with no local-runner
+    '''
     def __init__(self):
-        if sys.argv.__len__() == 4:
-            self.remote_process_client = RemoteProcessClient(sys.argv[1], int(sys.argv[2]))
-            self.token = sys.argv[3]
+        arguments = sys.argv[1:]
+        recording_path = None
+        replay_path = None
+        if arguments.__len__() >= 2 and arguments[-2] == '--record':
+            recording_path = arguments[-1]
+            arguments = arguments[:-2]
+        elif arguments.__len__() >= 2 and arguments[-2] == '--replay':
+            replay_path = arguments[-1]
+            arguments = arguments[:-2]
+
+        if replay_path is not None:
+            self.remote_process_client = RemoteProcessClient(None, None, ReplaySocket(read_frames(replay_path)))
+            self.token = "0000000000000000"
+        elif arguments.__len__() == 3:
+            self.remote_process_client = RemoteProcessClient(arguments[0], int(arguments[1]))
+            self.token = arguments[2]
         else:
             self.remote_process_client = RemoteProcessClient("localhost", 31000)
             self.token = "0000000000000000"
 
+        if recording_path is not None:
+            self.remote_process_client.start_recording(recording_path)
+        self.replay = replay_path is not None
+
     def run(self):
         try:
             self.remote_process_client.write_token(self.token)
@@ -27,6 +49,9 @@ class Runner:
 
             self.remote_process_client.write_selected_tanks(tank_types)
 
+            tick_count = 0
+            move_time = 0.
+
             while True:
                 player_context = self.remote_process_client.read_player_context()
                 if player_context is None:
@@ -38,12 +63,18 @@ class Runner:
 
                 moves = []
 
+                begin = time.time()
                 for strategy_index in xrange(team_size):
                     move = Move()
                     moves.append(move)
                     strategies[strategy_index].move(player_tanks[strategy_index], player_context.world, move)
+                move_time += time.time() - begin
+                tick_count += 1
 
                 self.remote_process_client.write_moves(moves)
+
+            if self.replay:
+                print "ticks: %d, move: %.2f ms per tick" % (tick_count, 1000. * move_time / max(1, tick_count))
         finally:
             self.remote_process_client.close()
 
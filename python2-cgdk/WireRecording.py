@@ -0,0 +1,97 @@
+'''
+Recording and replay of the raw inbound local-runner stream
+
+A recording is a sequence of frames, each one a complete inbound message
+(team size, one player context per tick, game over) prefixed with its
+length as a little-endian int.
+'''
+
+import struct
+
+FRAME_LENGTH_STRUCT = struct.Struct('<i')
+
+
+def read_frames(path):
+    frames = []
+    with open(path, 'rb') as stream:
+        data = stream.read()
+    offset = 0
+    while offset < len(data):
+        length = FRAME_LENGTH_STRUCT.unpack_from(data, offset)[0]
+        offset += FRAME_LENGTH_STRUCT.size
+        frames.append(data[offset:offset + length])
+        offset += length
+    return frames
+
+
+def write_frames(path, frames):
+    with open(path, 'wb') as stream:
+        for frame in frames:
+            stream.write(FRAME_LENGTH_STRUCT.pack(len(frame)))
+            stream.write(frame)
+
+
+class RecordingSocket:
+    '''socket wrapper that tees everything received into a recording'''
+    def __init__(self, socket, path):
+        self.socket = socket
+        self.stream = open(path, 'wb')
+        self.pending = bytearray()
+
+    def recv_into(self, buffer):
+        byte_count = self.socket.recv_into(buffer)
+        self.pending += buffer[:byte_count]
+        return byte_count
+
+    def end_frame(self, unread_byte_count):
+        '''everything received except the last unread_byte_count bytes is one message'''
+        frame_length = len(self.pending) - unread_byte_count
+        self.stream.write(FRAME_LENGTH_STRUCT.pack(frame_length))
+        self.stream.write(self.pending[:frame_length])
+        self.stream.flush()
+        del self.pending[:frame_length]
+
+    def sendall(self, bytes):
+        self.socket.sendall(bytes)
+
+    def close(self):
+        if self.pending:
+            self.end_frame(0)
+        self.stream.close()
+        self.socket.close()
+
+
+class ReplaySocket:
+    '''socket stand-in that serves recorded frames, one recv never crosses a frame'''
+    def __init__(self, frames):
+        self.frames = frames
+        self.frame_index = 0
+        self.frame_offset = 0
+        self.recv_count = 0
+
+    def next_chunk(self, byte_count):
+        while self.frame_index < len(self.frames) and \
+                self.frame_offset == len(self.frames[self.frame_index]):
+            self.frame_index += 1
+            self.frame_offset = 0
+        if self.frame_index == len(self.frames):
+            return ''
+        frame = self.frames[self.frame_index]
+        chunk = frame[self.frame_offset:self.frame_offset + byte_count]
+        self.frame_offset += len(chunk)
+        self.recv_count += 1
+        return chunk
+
+    def recv(self, byte_count):
+        return self.next_chunk(byte_count)
+
+    def recv_into(self, buffer):
+        chunk = self.next_chunk(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def sendall(self, bytes):
+        pass
+
+    def close(self):
+        pass
@@ -85,13 +85,15 @@ def get_power(tank):
 
 
 def get_team_power(world):
-    enemies = all_enemies(world)
-    teammates = all_teammates(world)
+    def compute():
+        enemies = all_enemies(world)
+        teammates = all_teammates(world)
 
-    enemy_power = sum([get_power(e) for e in enemies])
-    team_power = sum([get_power(t) for t in teammates])
+        enemy_power = sum([get_power(e) for e in enemies])
+        team_power = sum([get_power(t) for t in teammates])
 
-    return team_power / (team_power + enemy_power)
+        return team_power / (team_power + enemy_power)
+    return utils.get_tick_context(world).memoize('team_power', compute)
 
 
 def damage_probability(tank_x, tank_y, goal_x, goal_y):
@@ -125,18 +127,26 @@ def get_bonus_factor(tank, bonus):
     return get_power(new_tank) - get_power(tank)
 
 
-def time_to_get(tank, unit):
-    angle = abs(tank.get_angle_to_unit(unit))
+def time_to_get(tank, unit, world=None):
+    '''with world the tank rides around obstacles'''
+    if world is None:
+        x, y = unit.x, unit.y
+        distance = tank.get_distance_to_unit(unit)
+    else:
+        nav = utils.get_navigation(world)
+        x, y = nav.waypoint(tank.x, tank.y, unit.x, unit.y)
+        distance = nav.path_length(tank.x, tank.y, unit.x, unit.y)
+    angle = abs(tank.get_angle_to(x, y))
     if angle > math.pi / 2:
         angle = math.pi - angle
     time_to_turn = angle * 1.5
-    time_to_ride = tank.get_distance_to_unit(unit) / TANK_AVERAGE_SPEED
+    time_to_ride = distance / TANK_AVERAGE_SPEED
     return time_to_ride + time_to_turn
 
 
 def is_bonus_usefull(me, bonus, world):
     factor = get_bonus_factor(me, bonus)
-    time = time_to_get(me, bonus)
+    time = time_to_get(me, bonus, world)
 
     enemies = utils.all_enemies(world)
     teammates = utils.all_teammates_without_me(world, me)
@@ -186,39 +196,10 @@ def coeff_by_dist_factor(dist_factor):
     return 1. - 0.2 * dist_factor
 
 
-def shell_damage(shell, tank):
-    '''return health damage'''
-    pessimistic_tank = copy(tank)
-    pessimistic_tank.width *= 1.1
-    pessimistic_tank.height *= 1.1
-    front, right, back, left = utils.get_borders(pessimistic_tank)
-    # front, right, back, left = utils.get_borders(tank)
-
-    next_shell_x = shell.x + shell.speedX * 1000.
-    next_shell_y = shell.y + shell.speedY * 1000.
-
-    borders_with_intersections = [(b,
-            geometry.intervals_intersection(
-                    b[0], b[1], b[2], b[3], shell.x, shell.y, next_shell_x, next_shell_y)) for
-            b in front, right, back, left]
-
-    borders_with_intersections = filter(lambda bi: bi[1] is not None, borders_with_intersections)
-    if not borders_with_intersections:
-        return 0.
-    border, intersection_point = min(borders_with_intersections,
-            key=lambda b: math.hypot(b[1][0] - shell.x, b[1][1] - shell.y))
-
-    angle = geometry.get_angle(border[0] - border[2], border[1] - border[3], shell.speedX, shell.speedY)
-    if angle > math.pi / 2:
-        angle = math.pi - angle
-    angle = math.pi / 2. - angle
-
-    r1 = math.hypot(border[0] - intersection_point[0], border[1] - intersection_point[1])
-    r2 = math.hypot(border[2] - intersection_point[0], border[3] - intersection_point[1])
-    r = r1 + r2
-    dist_factor = (r - 2. * min(r1, r2)) / r
-
-    return coeff_by_angle(shell, geometry.rad_to_degree(angle)) * coeff_by_dist_factor(dist_factor)
+def shell_damage(shell, contact):
+    '''return health damage of a shell hitting a tank at contact, see prediction.time_of_impact'''
+    angle = geometry.rad_to_degree(contact.angle)
+    return coeff_by_angle(shell, angle) * coeff_by_dist_factor(contact.dist_factor)
 
 
 def regular_shell_time(dist):
@@ -0,0 +1,90 @@
+'''
+Decode benchmark for RemoteProcessClient
+
+usage: python benchmark.py [tick_count | recording]
+a recording made with Runner.py --record (or a scripted 3 x 3 game)
+is fed to the client tick by tick, the way the local-runner writes it to
+the socket, first in process and then over a loopback connection that
+answers every tick with moves
+'''
+
+import sys
+import time
+import socket
+
+from LocalRunnerServer import LocalRunnerServer, scripted_frames
+from RemoteProcessClient import RemoteProcessClient
+from WireRecording import ReplaySocket, read_frames
+from model.Move import Move
+from model.TankType import TankType
+
+
+class UncoalescedClient(RemoteProcessClient):
+    '''former write path: a sendall per field and Nagle's algorithm left on'''
+    def __init__(self, host, port):
+        RemoteProcessClient.__init__(self, host, port, socket.create_connection((host, port)))
+
+    def write_struct(self, compiled_struct, values):
+        self.socket.sendall(compiled_struct.pack(*values))
+
+    def write_bytes(self, bytes):
+        self.socket.sendall(bytes)
+
+
+def decode_all(frames):
+    '''return (tick count, seconds spent decoding, recv calls)'''
+    stream_socket = ReplaySocket(frames)
+    client = RemoteProcessClient(None, None, stream_socket)
+    client.read_team_size()
+
+    tick_count = 0
+    begin = time.time()
+    while client.read_player_context() is not None:
+        tick_count += 1
+    return tick_count, time.time() - begin, stream_socket.recv_count
+
+
+def loopback_round_trip(frames, client_class):
+    '''return seconds per tick spent between reading a context and the next one'''
+    server = LocalRunnerServer(frames)
+    thread = server.start()
+
+    client = client_class('localhost', server.port)
+    try:
+        client.write_token('0000000000000000')
+        team_size = client.read_team_size()
+        client.write_selected_tanks([TankType.MEDIUM] * team_size)
+
+        tick_count = 0
+        begin = time.time()
+        while True:
+            player_context = client.read_player_context()
+            if player_context is None:
+                break
+            client.write_moves([Move() for tank in player_context.tanks])
+            tick_count += 1
+        return (time.time() - begin) / max(1, tick_count)
+    finally:
+        client.close()
+        thread.join()
+
+
+def main():
+    argument = sys.argv[1] if len(sys.argv) > 1 else '2000'
+    if argument.isdigit():
+        frames = scripted_frames(int(argument))
+    else:
+        frames = read_frames(argument)
+    tick_count, seconds, recv_count = decode_all(frames)
+    print 'ticks: %d, bytes per tick: %d' % (tick_count, sum(len(f) for f in frames) / max(1, tick_count))
+    print 'decode: %.1f us per tick' % (1.e6 * seconds / max(1, tick_count))
+    print 'recv calls: %.1f per tick' % (float(recv_count) / max(1, tick_count))
+
+    loopback_frames = frames[:1] + frames[1:-1][:200] + frames[-1:]
+    for client_class in [UncoalescedClient, RemoteProcessClient]:
+        print '%s loopback: %.1f us per tick' % (
+                client_class.__name__, 1.e6 * loopback_round_trip(loopback_frames, client_class))
+
+
+if __name__ == '__main__':
+    main()
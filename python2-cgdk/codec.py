@@ -0,0 +1,391 @@
+'''
+Declarative schema of the local-runner protocol and the codec compiled from it
+
+Every record is a list of (attribute, field type) pairs in wire order.
+Consecutive fixed-width fields are packed into one precompiled struct.Struct,
+so a record is decoded with a few bulk unpacks instead of one call per field.
+Readers and writers (RemoteProcessClient, BytesReader) provide
+read_struct/write_struct, read_string/write_string and skip_bytes.
+'''
+
+import struct
+
+from model.Bonus import Bonus
+from model.BonusType import BonusType
+from model.FireType import FireType
+from model.Move import Move
+from model.Obstacle import Obstacle
+from model.Player import Player
+from model.PlayerContext import PlayerContext
+from model.Shell import Shell
+from model.ShellType import ShellType
+from model.Tank import Tank
+from model.TankType import TankType
+from model.World import World
+
+BYTE_ORDER = '<'
+
+
+class FixedType:
+    def __init__(self, format_char, decode=None, encode=None):
+        self.format_char = format_char
+        self.decode = decode
+        self.encode = encode
+
+
+_enum_tables = {}
+
+
+def enum_table(enum_class):
+    '''wire value -> enum value, unknown values are mapped to None by get'''
+    table = _enum_tables.get(enum_class)
+    if table is None:
+        table = dict((value, value) for key, value in enum_class.__dict__.iteritems()
+                if not str(key).startswith('__'))
+        _enum_tables[enum_class] = table
+    return table
+
+
+def enum(enum_class):
+    return FixedType('b', enum_table(enum_class).get, lambda value: -1 if value is None else value)
+
+
+INT = FixedType('i')
+LONG = FixedType('q')
+DOUBLE = FixedType('d')
+BOOLEAN = FixedType('b', lambda value: value == 1, lambda value: 1 if value else 0)
+
+
+class StringCodec:
+    def read(self, reader):
+        return reader.read_string()
+
+    def skip(self, reader):
+        length = reader.read_int()
+        if length > 0:
+            reader.skip_bytes(length)
+
+    def write(self, writer, value):
+        writer.write_string(value)
+
+
+STRING = StringCodec()
+
+
+class RecordCodec:
+    '''record_class is called with the field values in wire order'''
+    def __init__(self, record_class, fields):
+        self.record_class = record_class
+        self.names = [name for name, field_type in fields]
+        self.decoders = []
+        self.encoders = []
+        # (struct.Struct, value count, True) for fixed-width runs, (codec, 1, False) otherwise
+        self.steps = []
+
+        run = []
+        for index, (name, field_type) in enumerate(fields):
+            if isinstance(field_type, FixedType):
+                run.append(field_type.format_char)
+                if field_type.decode is not None:
+                    self.decoders.append((index, field_type.decode))
+                if field_type.encode is not None:
+                    self.encoders.append((index, field_type.encode))
+                continue
+            if run:
+                self.steps.append((struct.Struct(BYTE_ORDER + ''.join(run)), len(run), True))
+                run = []
+            self.steps.append((field_type, 1, False))
+        if run:
+            self.steps.append((struct.Struct(BYTE_ORDER + ''.join(run)), len(run), True))
+
+    def read_values(self, reader):
+        values = []
+        for step, count, fixed in self.steps:
+            if fixed:
+                values.extend(reader.read_struct(step))
+            else:
+                values.append(step.read(reader))
+        for index, decode in self.decoders:
+            values[index] = decode(values[index])
+        return values
+
+    def skip(self, reader):
+        for step, count, fixed in self.steps:
+            if fixed:
+                reader.skip_bytes(step.size)
+            else:
+                step.skip(reader)
+
+    def write_values(self, writer, values):
+        for index, encode in self.encoders:
+            values[index] = encode(values[index])
+        position = 0
+        for step, count, fixed in self.steps:
+            if fixed:
+                writer.write_struct(step, values[position:position + count])
+            else:
+                step.write(writer, values[position])
+            position += count
+
+    def read(self, reader):
+        return self.record_class(*self.read_values(reader))
+
+    def write(self, writer, record):
+        self.write_values(writer, [getattr(record, name) for name in self.names])
+
+
+class ValueCodec(RecordCodec):
+    '''single bare value'''
+    def __init__(self, field_type):
+        RecordCodec.__init__(self, None, [('value', field_type)])
+
+    def read(self, reader):
+        return self.read_values(reader)[0]
+
+    def write(self, writer, value):
+        self.write_values(writer, [value])
+
+
+class OptionalCodec:
+    '''value preceded by a presence flag'''
+    def __init__(self, codec):
+        self.codec = codec
+        self.flag = ValueCodec(BOOLEAN)
+
+    def read(self, reader):
+        return self.codec.read(reader) if self.flag.read(reader) else None
+
+    def skip(self, reader):
+        if self.flag.read(reader):
+            self.codec.skip(reader)
+
+    def write(self, writer, value):
+        self.flag.write(writer, value is not None)
+        if value is not None:
+            self.codec.write(writer, value)
+
+
+class ListCodec:
+    '''item count (-1 for None) followed by the items'''
+    def __init__(self, item_codec):
+        self.item_codec = item_codec
+        self.count = ValueCodec(INT)
+
+    def read(self, reader):
+        count = self.count.read(reader)
+        if count < 0:
+            return None
+        item_codec = self.item_codec
+        return [item_codec.read(reader) for index in xrange(count)]
+
+    def skip(self, reader):
+        item_codec = self.item_codec
+        for index in xrange(self.count.read(reader)):
+            item_codec.skip(reader)
+
+    def write(self, writer, items):
+        if items is None:
+            self.count.write(writer, -1)
+            return
+        self.count.write(writer, len(items))
+        for item in items:
+            self.item_codec.write(writer, item)
+
+
+class BytesReader:
+    '''reader over a complete byte string'''
+    INT_STRUCT = struct.Struct(BYTE_ORDER + 'i')
+
+    def __init__(self, bytes):
+        self.bytes = bytes
+        self.offset = 0
+
+    def read_struct(self, compiled_struct):
+        values = compiled_struct.unpack_from(self.bytes, self.offset)
+        self.offset += compiled_struct.size
+        return values
+
+    def read_int(self):
+        return self.read_struct(BytesReader.INT_STRUCT)[0]
+
+    def read_string(self):
+        length = self.read_int()
+        if length == -1:
+            return None
+        offset = self.offset
+        self.offset += length
+        return self.bytes[offset:offset + length].decode('utf-8')
+
+    def skip_bytes(self, byte_count):
+        self.offset += byte_count
+
+
+class LazyValue:
+    '''raw bytes of a value, decoded on the first get'''
+    def __init__(self, codec, bytes):
+        self.codec = codec
+        self.bytes = bytes
+        self.decoded = False
+        self.value = None
+
+    def get(self):
+        if not self.decoded:
+            self.value = self.codec.read(BytesReader(self.bytes))
+            self.decoded = True
+        return self.value
+
+
+class LazyCodec:
+    '''reads a LazyValue instead of the value itself
+    with reuse the previous LazyValue (and so the decoded value) is returned
+    while the bytes stay the same
+    '''
+    def __init__(self, codec, reuse=False):
+        self.codec = codec
+        self.reuse = reuse
+        self.last = None
+
+    def read(self, reader):
+        reader.mark_buffer()
+        self.codec.skip(reader)
+        bytes = reader.take_marked()
+        if self.reuse and self.last is not None and self.last.bytes == bytes:
+            return self.last
+        lazy_value = LazyValue(self.codec, bytes)
+        if self.reuse:
+            self.last = lazy_value
+        return lazy_value
+
+    def skip(self, reader):
+        self.codec.skip(reader)
+
+    def write(self, writer, value):
+        self.codec.write(writer, value)
+
+
+class LazyWorld(World):
+    '''World with players, obstacles and bonuses decoded on first access'''
+    LAZY_FIELDS = ['players', 'obstacles', 'bonuses']
+
+    def __init__(self, tick, width, height, players, obstacles, tanks, shells, bonuses):
+        self.tick = tick
+        self.width = width
+        self.height = height
+        self.tanks = tanks
+        self.shells = shells
+        self.lazy_values = {'players': players, 'obstacles': obstacles, 'bonuses': bonuses}
+
+    def __getattr__(self, name):
+        lazy_value = self.__dict__.get('lazy_values', {}).pop(name, None)
+        if lazy_value is None:
+            raise AttributeError(name)
+        value = lazy_value.get()
+        setattr(self, name, value)
+        return value
+
+
+PLAYER = RecordCodec(Player, [
+    ('name', STRING),
+    ('score', INT),
+    ('strategy_crashed', BOOLEAN),
+])
+
+OBSTACLE = RecordCodec(Obstacle, [
+    ('id', LONG),
+    ('width', DOUBLE),
+    ('height', DOUBLE),
+    ('x', DOUBLE),
+    ('y', DOUBLE),
+])
+
+TANK = RecordCodec(Tank, [
+    ('id', LONG),
+    ('player_name', STRING),
+    ('teammate_index', INT),
+    ('x', DOUBLE),
+    ('y', DOUBLE),
+    ('speedX', DOUBLE),
+    ('speedY', DOUBLE),
+    ('angle', DOUBLE),
+    ('angular_speed', DOUBLE),
+    ('turret_relative_angle', DOUBLE),
+    ('crew_health', INT),
+    ('hull_durability', INT),
+    ('reloading_time', INT),
+    ('remaining_reloading_time', INT),
+    ('premium_shell_count', INT),
+    ('teammate', BOOLEAN),
+    ('type', enum(TankType)),
+])
+
+SHELL = RecordCodec(Shell, [
+    ('id', LONG),
+    ('player_name', STRING),
+    ('width', DOUBLE),
+    ('height', DOUBLE),
+    ('x', DOUBLE),
+    ('y', DOUBLE),
+    ('speedX', DOUBLE),
+    ('speedY', DOUBLE),
+    ('angle', DOUBLE),
+    ('angular_speed', DOUBLE),
+    ('type', enum(ShellType)),
+])
+
+BONUS = RecordCodec(Bonus, [
+    ('id', LONG),
+    ('width', DOUBLE),
+    ('height', DOUBLE),
+    ('x', DOUBLE),
+    ('y', DOUBLE),
+    ('type', enum(BonusType)),
+])
+
+PLAYERS = ListCodec(OptionalCodec(PLAYER))
+OBSTACLES = ListCodec(OptionalCodec(OBSTACLE))
+TANKS = ListCodec(OptionalCodec(TANK))
+SHELLS = ListCodec(OptionalCodec(SHELL))
+BONUSES = ListCodec(OptionalCodec(BONUS))
+
+# obstacles never change within a game, so their list is shared between ticks
+WORLD = RecordCodec(LazyWorld, [
+    ('tick', INT),
+    ('width', DOUBLE),
+    ('height', DOUBLE),
+    ('players', LazyCodec(PLAYERS)),
+    ('obstacles', LazyCodec(OBSTACLES, reuse=True)),
+    ('tanks', TANKS),
+    ('shells', SHELLS),
+    ('bonuses', LazyCodec(BONUSES)),
+])
+
+OPTIONAL_WORLD = OptionalCodec(WORLD)
+
+PLAYER_CONTEXT_RECORD = RecordCodec(PlayerContext, [
+    ('tanks', TANKS),
+    ('world', OPTIONAL_WORLD),
+])
+
+def _make_move(left_track_power, right_track_power, turret_turn, fire_type):
+    move = Move()
+    move.left_track_power = left_track_power
+    move.right_track_power = right_track_power
+    move.turret_turn = turret_turn
+    move.fire_type = fire_type
+    return move
+
+
+MOVE = RecordCodec(_make_move, [
+    ('left_track_power', DOUBLE),
+    ('right_track_power', DOUBLE),
+    ('turret_turn', DOUBLE),
+    ('fire_type', enum(FireType)),
+])
+
+
+# message bodies, the message type byte is handled by the caller
+AUTHENTICATION_TOKEN = ValueCodec(STRING)
+TEAM_SIZE = ValueCodec(INT)
+TANK_TYPES = ListCodec(ValueCodec(enum(TankType)))
+PLAYER_CONTEXT = OptionalCodec(PLAYER_CONTEXT_RECORD)
+MOVES = ListCodec(OptionalCodec(MOVE))
@@ -37,6 +37,72 @@ def are_intervals_intersect(x1, y1, x2, y2, x3, y3, x4, y4):
     return intervals_intersection(x1, y1, x2, y2, x3, y3, x4, y4) is not None
 
 
+def crossings(segments1, segments2):
+    '''(i, j, t) for every segment segments1[i] crossing segments2[j], t is the position
+    of the hit along segments1[i] (0 - start, 1 - end); segments are (x1, y1, x2, y2)
+    tuples, tolerances are those of intervals_intersection
+    '''
+    directions2 = [(x3, y3, x3 - x4, y3 - y4) for x3, y3, x4, y4 in segments2]
+    for i, (x1, y1, x2, y2) in enumerate(segments1):
+        a1 = x2 - x1
+        a2 = y2 - y1
+        for j, (x3, y3, b1, b2) in enumerate(directions2):
+            d = float(a1 * b2 - a2 * b1)
+            if abs(d) < 0.001:
+                continue
+            c1 = x3 - x1
+            c2 = y3 - y1
+            t = (c1 * b2 - c2 * b1) / d
+            if not 0 <= t <= 1:
+                continue
+            s = (c2 * a1 - c1 * a2) / d
+            if 0 <= s <= 1:
+                yield i, j, t
+
+
+def intervals_intersections(segments1, segments2):
+    '''every segment of segments1 against every segment of segments2 at once
+    return (hits, params): hits[i][j] is True if segments1[i] crosses segments2[j],
+    params[i][j] is the position of the hit along segments1[i] or None
+    '''
+    hits = [[False] * len(segments2) for segment in segments1]
+    params = [[None] * len(segments2) for segment in segments1]
+    for i, j, t in crossings(segments1, segments2):
+        hits[i][j] = True
+        params[i][j] = t
+    return hits, params
+
+
+def any_intervals_intersect(segments1, segments2):
+    '''True if some segment of segments1 crosses some segment of segments2'''
+    for crossing in crossings(segments1, segments2):
+        return True
+    return False
+
+
+def point_on_interval(x1, y1, x2, y2, t):
+    return (x2 * t + (1 - t) * x1, y2 * t + (1 - t) * y1)
+
+
+def are_boxes_overlapping(box1, box2):
+    '''separating axis test for two oriented boxes, touching boxes overlap
+    box is (x, y, vx, vy, half_width, half_height): center, unit vector along the width
+    and half sizes
+    '''
+    x1, y1, vx1, vy1, w1, h1 = box1
+    x2, y2, vx2, vy2, w2, h2 = box2
+    dx = x2 - x1
+    dy = y2 - y1
+
+    # axes: both sides of box1 then both sides of box2, normal of (vx, vy) is (vy, -vx)
+    for ax, ay in ((vx1, vy1), (vy1, -vx1), (vx2, vy2), (vy2, -vx2)):
+        r1 = w1 * abs(vx1 * ax + vy1 * ay) + h1 * abs(vy1 * ax - vx1 * ay)
+        r2 = w2 * abs(vx2 * ax + vy2 * ay) + h2 * abs(vy2 * ax - vx2 * ay)
+        if abs(dx * ax + dy * ay) > r1 + r2:
+            return False
+    return True
+
+
 # for aa, correct in [
 #         ((0, 0, 0, 1, 0, 0, 1, 0), True),
 #         ((0, 0.5, 0, 1, 0.5, 0, 1, 0), False),
@@ -3,6 +3,9 @@ from zipfile import ZipFile
 with ZipFile('strategy.zip', 'w') as out:
     out.write('geometry.py')
     out.write('utils.py')
+    out.write('spatial.py')
+    out.write('mapcache.py')
+    out.write('navigation.py')
     out.write('constants.py')
     out.write('assessments.py')
     out.write('prediction.py')
@@ -0,0 +1,90 @@
+'''
+Per-map static data kept on disk between games
+
+A cache file is named after a hash of the obstacle layout and holds named
+sections of raw bytes, each section is packed and unpacked by its owner.
+Missing, stale or unreadable files are ignored, so is a read-only disk.
+'''
+
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import tempfile
+
+MAGIC = 'RAICMAP'
+VERSION = 1
+
+HEADER_STRUCT = struct.Struct('<8sii')
+SECTION_STRUCT = struct.Struct('<16sii')
+
+# empty MAP_CACHE_DIRECTORY turns the cache off
+CACHE_DIRECTORY = os.environ.get('MAP_CACHE_DIRECTORY',
+        os.path.join(tempfile.gettempdir(), 'russianaicup2012-maps'))
+
+
+def layout_key(obstacles):
+    '''sections are packed in native byte order, so it is a part of the key'''
+    layout = [sys.byteorder, str(VERSION)]
+    for o in obstacles:
+        layout.append(repr((o.id, o.x, o.y, o.width, o.height)))
+    return hashlib.sha1('\n'.join(layout)).hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIRECTORY, key + '.map')
+
+
+def load_sections(key):
+    '''section name -> bytes, empty when there is no usable file'''
+    if not CACHE_DIRECTORY:
+        return {}
+    try:
+        with open(cache_path(key), 'rb') as stream:
+            data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    try:
+        magic, version, section_count = HEADER_STRUCT.unpack_from(data, 0)
+        if magic.rstrip('\0') != MAGIC or version != VERSION:
+            return {}
+        sections = {}
+        offset = HEADER_STRUCT.size + section_count * SECTION_STRUCT.size
+        for index in xrange(section_count):
+            name, start, length = SECTION_STRUCT.unpack_from(
+                    data, HEADER_STRUCT.size + index * SECTION_STRUCT.size)
+            if start < offset or start + length > len(data):
+                return {}
+            sections[name.rstrip('\0')] = data[start:start + length]
+        return sections
+    except struct.error:
+        return {}
+    finally:
+        data.close()
+
+
+def save_sections(key, sections):
+    '''write all sections at once, return False when the file could not be written'''
+    if not CACHE_DIRECTORY:
+        return False
+    names = sorted(sections)
+    chunks = [HEADER_STRUCT.pack(MAGIC, VERSION, len(names))]
+    offset = HEADER_STRUCT.size + len(names) * SECTION_STRUCT.size
+    for name in names:
+        chunks.append(SECTION_STRUCT.pack(name, offset, len(sections[name])))
+        offset += len(sections[name])
+    chunks.extend(str(sections[name]) for name in names)
+
+    try:
+        if not os.path.isdir(CACHE_DIRECTORY):
+            os.makedirs(CACHE_DIRECTORY)
+        # written aside and renamed, a reader never sees half a file
+        descriptor, temp_path = tempfile.mkstemp(dir=CACHE_DIRECTORY)
+        with os.fdopen(descriptor, 'wb') as stream:
+            stream.write(''.join(chunks))
+        os.rename(temp_path, cache_path(key))
+    except (IOError, OSError):
+        return False
+    return True
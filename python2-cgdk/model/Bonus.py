@@ -1,6 +1,8 @@
 from Unit import Unit
 
 class Bonus(Unit):
+    __slots__ = ('type',)
+
     def __init__(self, id, width, height, x, y, type):
         Unit.__init__(self, id, width, height, x, y, 0.0, 0.0, 0.0, 0.0)
 
@@ -1,5 +1,7 @@
 from Unit import Unit
 
 class Obstacle(Unit):
+    __slots__ = ()
+
     def __init__(self, id, width, height, x, y):
         Unit.__init__(self, id, width, height, x, y, 0.0, 0.0, 0.0, 0.0)
\ No newline at end of file
@@ -1,6 +1,8 @@
 from Unit import Unit
 
 class Shell(Unit):
+    __slots__ = ('player_name', 'type')
+
     def __init__(self, id, player_name, width, height, x, y, speed_x, speed_y, angle, angular_speed, type):
         Unit.__init__(self, id, width, height, x, y, speed_x, speed_y, angle, angular_speed)
 
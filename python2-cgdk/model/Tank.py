@@ -1,29 +1,86 @@
 from math import *
+from operator import attrgetter
 
 from TankType import TankType
 from Unit import Unit
 
+
+class TankSpec(object):
+    __slots__ = ('width', 'height', 'virtual_gun_length', 'mass', 'engine_power', 'engine_rear_power_factor',
+                 'turret_turn_speed', 'turret_max_relative_angle', 'crew_max_health', 'hull_max_durability',
+                 'frontal_armor', 'side_armor', 'rear_armor')
+
+    def __init__(self, **values):
+        for name in TankSpec.__slots__:
+            setattr(self, name, values[name])
+
+
+TANK_SPECS = {
+    TankType.MEDIUM: TankSpec(
+        width=90.0,
+        height=60.0,
+        virtual_gun_length=67.5,
+        mass=10.0,
+        engine_power=7500.0,
+        engine_rear_power_factor=0.75,
+        turret_turn_speed=1.0 * pi / 180.0,
+        turret_max_relative_angle=0.0 * pi / 180.0,
+        crew_max_health=100,
+        hull_max_durability=200,
+        frontal_armor=175,
+        side_armor=150,
+        rear_armor=100
+    ),
+    TankType.HEAVY: TankSpec(
+        width=105.0,
+        height=75.0,
+        virtual_gun_length=82.5,
+        mass=20.0,
+        engine_power=8500.0,
+        engine_rear_power_factor=0.65,
+        turret_turn_speed=0.5 * pi / 180.0,
+        turret_max_relative_angle=0.0 * pi / 180.0,
+        crew_max_health=100,
+        hull_max_durability=250,
+        frontal_armor=200,
+        side_armor=175,
+        rear_armor=100
+    ),
+    TankType.TANK_DESTROYER: TankSpec(
+        width=112.5,
+        height=67.5,
+        virtual_gun_length=97.5,
+        mass=15.0,
+        engine_power=5000.0,
+        engine_rear_power_factor=0.5,
+        turret_turn_speed=1.5 * pi / 180.0,
+        turret_max_relative_angle=15.0 * pi / 180.0,
+        crew_max_health=100,
+        hull_max_durability=250,
+        frontal_armor=250,
+        side_armor=125,
+        rear_armor=100
+    ),
+}
+
+
 def get_width(type):
-    return {
-               TankType.MEDIUM: 90.0,
-               TankType.HEAVY: 105.0,
-               TankType.TANK_DESTROYER: 112.5
-           }[type]
+    return TANK_SPECS[type].width
 
 
 def get_height(type):
-    return {
-               TankType.MEDIUM: 60.0,
-               TankType.HEAVY: 75.0,
-               TankType.TANK_DESTROYER: 67.5
-           }[type]
+    return TANK_SPECS[type].height
 
 
 class Tank(Unit):
+    __slots__ = ('player_name', 'teammate_index', 'turret_relative_angle', 'crew_health', 'hull_durability',
+                 'reloading_time', 'remaining_reloading_time', 'premium_shell_count', 'teammate', 'type', 'spec')
+
     def __init__(self, id, player_name, teammate_index, x, y, speed_x, speed_y, angle, angular_speed,
                  turret_relative_angle, crew_health, hull_durability,
                  reloading_time, remaining_reloading_time, premium_shell_count, teammate, type):
-        Unit.__init__(self, id, get_width(type), get_height(type), x, y, speed_x, speed_y, angle, angular_speed)
+        spec = TANK_SPECS[type]
+        Unit.__init__(self, id, spec.width, spec.height, x, y, speed_x, speed_y, angle, angular_speed)
 
         self.player_name = player_name
         self.teammate_index = teammate_index
@@ -35,72 +92,19 @@ class Tank(Unit):
         self.premium_shell_count = premium_shell_count
         self.teammate = teammate
         self.type = type
-
-        self.virtual_gun_length = {
-                                      TankType.MEDIUM: 67.5,
-                                      TankType.HEAVY: 82.5,
-                                      TankType.TANK_DESTROYER: 97.5
-                                  }[type]
-
-        self.mass = {
-                        TankType.MEDIUM: 10.0,
-                        TankType.HEAVY: 20.0,
-                        TankType.TANK_DESTROYER: 15.0
-                    }[type]
-
-        self.engine_power = {
-                                TankType.MEDIUM: 7500.0,
-                                TankType.HEAVY: 8500.0,
-                                TankType.TANK_DESTROYER: 5000.0
-                            }[type]
-
-        self.engine_rear_power_factor = {
-                                            TankType.MEDIUM: 0.75,
-                                            TankType.HEAVY: 0.65,
-                                            TankType.TANK_DESTROYER: 0.5
-                                        }[type]
-
-        self.turret_turn_speed = {
-                                     TankType.MEDIUM: 1.0 * pi / 180.0,
-                                     TankType.HEAVY: 0.5 * pi / 180.0,
-                                     TankType.TANK_DESTROYER: 1.5 * pi / 180.0
-                                 }[type]
-
-        self.turret_max_relative_angle = {
-                                             TankType.MEDIUM: 0.0 * pi / 180.0,
-                                             TankType.HEAVY: 0.0 * pi / 180.0,
-                                             TankType.TANK_DESTROYER: 15.0 * pi / 180.0
-                                         }[type]
-
-        self.crew_max_health = {
-                                   TankType.MEDIUM: 100,
-                                   TankType.HEAVY: 100,
-                                   TankType.TANK_DESTROYER: 100
-                               }[type]
-
-        self.hull_max_durability = {
-                                       TankType.MEDIUM: 200,
-                                       TankType.HEAVY: 250,
-                                       TankType.TANK_DESTROYER: 250
-                                   }[type]
-
-        self.frontal_armor = {
-                                 TankType.MEDIUM: 175,
-                                 TankType.HEAVY: 200,
-                                 TankType.TANK_DESTROYER: 250
-                             }[type]
-
-        self.side_armor = {
-                                   TankType.MEDIUM: 150,
-                                   TankType.HEAVY: 175,
-                                   TankType.TANK_DESTROYER: 125
-                               }[type]
-
-        self.rear_armor = {
-                                   TankType.MEDIUM: 100,
-                                   TankType.HEAVY: 100,
-                                   TankType.TANK_DESTROYER: 100
-                               }[type]
+        self.spec = spec
+
+    virtual_gun_length = property(attrgetter('spec.virtual_gun_length'))
+    mass = property(attrgetter('spec.mass'))
+    engine_power = property(attrgetter('spec.engine_power'))
+    engine_rear_power_factor = property(attrgetter('spec.engine_rear_power_factor'))
+    turret_turn_speed = property(attrgetter('spec.turret_turn_speed'))
+    turret_max_relative_angle = property(attrgetter('spec.turret_max_relative_angle'))
+    crew_max_health = property(attrgetter('spec.crew_max_health'))
+    hull_max_durability = property(attrgetter('spec.hull_max_durability'))
+    frontal_armor = property(attrgetter('spec.frontal_armor'))
+    side_armor = property(attrgetter('spec.side_armor'))
+    rear_armor = property(attrgetter('spec.rear_armor'))
 
     def get_turret_angle_to(self, x, y):
         absolute_angle_to = atan2(y - self.y, x - self.x)
@@ -115,4 +119,4 @@ class Tank(Unit):
         return relative_angle_to
 
     def get_turret_angle_to_unit(self, unit):
-        return self.get_turret_angle_to(unit.x, unit.y)
\ No newline at end of file
+        return self.get_turret_angle_to(unit.x, unit.y)
@@ -1,6 +1,8 @@
 from math import *
 
-class Unit:
+class Unit(object):
+    __slots__ = ('id', 'width', 'height', 'x', 'y', 'speedX', 'speedY', 'angle', 'angular_speed')
+
     def __init__(self, id, width, height, x, y, speed_x, speed_y, angle, angular_speed):
         self.id = id
         self.width = width
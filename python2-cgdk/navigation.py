@@ -0,0 +1,240 @@
+'''
+Paths around obstacles over an occupancy grid
+
+A DistanceField holds the path length from every cell to its goal cell and
+the next cell on the way there, so a tank gets its waypoint and travel time
+by lookups. Goals are snapped to blocks of cells, fields are built once per
+block and shared by the team. Fields asked for within a tick are built on
+the next ticks, one a tick, until then the way to their goals is straight.
+'''
+
+import math
+import heapq
+from array import array
+from collections import OrderedDict
+
+import constants
+
+NAV_CELL_SIZE = 20.
+# closest distance from an obstacle side to a tank center, half of the tank's shorter side
+NAV_CLEARANCE = 30.
+# goals within a block of GOAL_BLOCK_CELLS x GOAL_BLOCK_CELLS cells share a field
+GOAL_BLOCK_CELLS = 4
+# fields kept per map, enough for every goal block of the world
+FIELD_CACHE_SIZE = 160
+FIELD_BUILDS_PER_TICK = 1
+# a waypoint is this many cells ahead along the flow
+WAYPOINT_CELLS = 4
+
+UNREACHABLE = float('inf')
+
+
+class OccupancyGrid:
+    '''blocked - flags of the cells a tank center can not take, indexed column * rows + row'''
+    def __init__(self, blocked, width=constants.WORLD_WIDTH, height=constants.WORLD_HEIGHT,
+            cell_size=NAV_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self.columns, self.rows = grid_shape(width, height, cell_size)
+        self.blocked = blocked
+
+        # (cell, length) of the steps out of every cell, diagonal steps do not cut blocked corners
+        self.links = []
+        for i in xrange(self.columns):
+            for j in xrange(self.rows):
+                links = []
+                for di in (-1, 0, 1):
+                    for dj in (-1, 0, 1):
+                        if not (di or dj) or not (0 <= i + di < self.columns and 0 <= j + dj < self.rows):
+                            continue
+                        if di and dj and (self.blocked[(i + di) * self.rows + j] or
+                                self.blocked[i * self.rows + j + dj]):
+                            continue
+                        links.append(((i + di) * self.rows + j + dj, self.cell_size * math.hypot(di, dj)))
+                self.links.append(links)
+
+    def column(self, x):
+        return min(self.columns - 1, max(0, int(x / self.cell_size)))
+
+    def row(self, y):
+        return min(self.rows - 1, max(0, int(y / self.cell_size)))
+
+    def cell(self, x, y):
+        '''points outside the world belong to the nearest border cell'''
+        return self.column(x) * self.rows + self.row(y)
+
+    def center(self, cell):
+        return (cell / self.rows + 0.5) * self.cell_size, (cell % self.rows + 0.5) * self.cell_size
+
+    def is_clear(self, x1, y1, x2, y2):
+        '''True when no cell the segment passes between its end cells is blocked
+        the end cells are left out as the distance fields reach blocked cells too
+        '''
+        i, j = self.column(x1), self.row(y1)
+        i_end, j_end = self.column(x2), self.row(y2)
+        dx = x2 - x1
+        dy = y2 - y1
+        step_i = 1 if dx > 0. else -1
+        step_j = 1 if dy > 0. else -1
+        # segment parameters of the next column and row borders and of a cell side
+        t_x = ((i + (step_i > 0)) * self.cell_size - x1) / dx if dx else UNREACHABLE
+        t_y = ((j + (step_j > 0)) * self.cell_size - y1) / dy if dy else UNREACHABLE
+        t_dx = self.cell_size / abs(dx) if dx else UNREACHABLE
+        t_dy = self.cell_size / abs(dy) if dy else UNREACHABLE
+        for step in xrange(abs(i_end - i) + abs(j_end - j) - 1):
+            if t_x < t_y:
+                i += step_i
+                t_x += t_dx
+            else:
+                j += step_j
+                t_y += t_dy
+            if self.blocked[i * self.rows + j]:
+                return False
+        return True
+
+
+def grid_shape(width=constants.WORLD_WIDTH, height=constants.WORLD_HEIGHT, cell_size=NAV_CELL_SIZE):
+    '''(columns, rows) of an OccupancyGrid'''
+    return int(math.ceil(width / float(cell_size))), int(math.ceil(height / float(cell_size)))
+
+
+def build_occupancy_grid(mask, mask_rows, mask_cell_size, clearance=NAV_CLEARANCE):
+    '''grid with cells blocked when their centers are within clearance of the center of an
+    obstacle cell of mask, the obstacle raster with mask_cell_size cells indexed
+    column * mask_rows + row; mask cells cover obstacles with a margin, so their centers
+    stand for the obstacle sides
+    '''
+    columns, rows = grid_shape()
+    blocked = bytearray(columns * rows)
+    for index, flag in enumerate(mask):
+        if not flag:
+            continue
+        x = (index / mask_rows + 0.5) * mask_cell_size
+        y = (index % mask_rows + 0.5) * mask_cell_size
+        for i in xrange(max(0, int((x - clearance) / NAV_CELL_SIZE)),
+                min(columns, int((x + clearance) / NAV_CELL_SIZE) + 1)):
+            for j in xrange(max(0, int((y - clearance) / NAV_CELL_SIZE)),
+                    min(rows, int((y + clearance) / NAV_CELL_SIZE) + 1)):
+                if (abs((i + 0.5) * NAV_CELL_SIZE - x) < clearance and
+                        abs((j + 0.5) * NAV_CELL_SIZE - y) < clearance):
+                    blocked[i * rows + j] = 1
+    return OccupancyGrid(blocked)
+
+
+def load_occupancy_grid(section):
+    '''grid from the blocked flags, None when they do not fit the world'''
+    columns, rows = grid_shape()
+    if len(section) != columns * rows:
+        return None
+    return OccupancyGrid(bytearray(section))
+
+
+class DistanceField:
+    '''path lengths to the goal cell and the next cell on the way for every cell
+    blocked cells are reached but never passed, so a tank pressed to an obstacle
+    still finds its way out; cells with no path keep UNREACHABLE
+    '''
+    def __init__(self, grid, goal):
+        self.grid = grid
+        self.goal = goal
+        count = grid.columns * grid.rows
+        self.distances = array('d', [UNREACHABLE]) * count
+        self.next_cells = array('i', [-1]) * count
+
+        distances = self.distances
+        next_cells = self.next_cells
+        blocked = grid.blocked
+        links = grid.links
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        distances[goal] = 0.
+        next_cells[goal] = goal
+        queue = [(0., goal)]
+        while queue:
+            distance, cell = heappop(queue)
+            if distance > distances[cell]:
+                continue
+            if blocked[cell] and cell != goal:
+                continue
+            for other, length in links[cell]:
+                other_distance = distance + length
+                if other_distance < distances[other]:
+                    distances[other] = other_distance
+                    next_cells[other] = cell
+                    heappush(queue, (other_distance, other))
+
+
+class Navigation:
+    '''distance fields of a map by goal block'''
+    def __init__(self, grid):
+        self.grid = grid
+        self.fields = OrderedDict()
+        self.goals = {}
+        # goal cells asked for without a field, in order
+        self.pending = OrderedDict()
+
+    def update(self):
+        '''build the fields asked for on earlier ticks, once a tick'''
+        for i in xrange(min(FIELD_BUILDS_PER_TICK, len(self.pending))):
+            goal = self.pending.popitem(last=False)[0]
+            if len(self.fields) >= FIELD_CACHE_SIZE:
+                self.fields.popitem(last=False)
+            self.fields[goal] = DistanceField(self.grid, goal)
+
+    def goal_cell(self, x, y):
+        '''free cell of the goal block of (x, y) nearest to the block center,
+        the cell of (x, y) when the whole block is blocked'''
+        grid = self.grid
+        bi = grid.column(x) / GOAL_BLOCK_CELLS
+        bj = grid.row(y) / GOAL_BLOCK_CELLS
+        cell = self.goals.get((bi, bj))
+        if cell is None:
+            ci = (bi + 0.5) * GOAL_BLOCK_CELLS - 0.5
+            cj = (bj + 0.5) * GOAL_BLOCK_CELLS - 0.5
+            free = [(math.hypot(i - ci, j - cj), i * grid.rows + j)
+                    for i in xrange(bi * GOAL_BLOCK_CELLS, min(grid.columns, (bi + 1) * GOAL_BLOCK_CELLS))
+                    for j in xrange(bj * GOAL_BLOCK_CELLS, min(grid.rows, (bj + 1) * GOAL_BLOCK_CELLS))
+                    if not grid.blocked[i * grid.rows + j]]
+            if not free:
+                return grid.cell(x, y)
+            cell = min(free)[1]
+            self.goals[(bi, bj)] = cell
+        return cell
+
+    def field(self, x, y):
+        '''None until update builds it, so every query of a tick sees the same fields'''
+        goal = self.goal_cell(x, y)
+        field = self.fields.pop(goal, None)
+        if field is None:
+            self.pending[goal] = True
+            return None
+        self.fields[goal] = field
+        return field
+
+    def path_length(self, x, y, goal_x, goal_y):
+        '''length of the way from (x, y) to the goal through the goal cell of its block,
+        straight when nothing is in the way, the field is not built yet or there is no way'''
+        if self.grid.is_clear(x, y, goal_x, goal_y):
+            return math.hypot(goal_x - x, goal_y - y)
+        field = self.field(goal_x, goal_y)
+        distance = UNREACHABLE if field is None else field.distances[self.grid.cell(x, y)]
+        if distance == UNREACHABLE:
+            return math.hypot(goal_x - x, goal_y - y)
+        cx, cy = self.grid.center(field.goal)
+        return distance + math.hypot(goal_x - cx, goal_y - cy)
+
+    def waypoint(self, x, y, goal_x, goal_y):
+        '''point to drive at from (x, y) on the way to the goal'''
+        if self.grid.is_clear(x, y, goal_x, goal_y):
+            return goal_x, goal_y
+        field = self.field(goal_x, goal_y)
+        cell = self.grid.cell(x, y)
+        if field is None or field.distances[cell] == UNREACHABLE:
+            return goal_x, goal_y
+        for step in xrange(WAYPOINT_CELLS):
+            cell = field.next_cells[cell]
+            if cell == field.goal:
+                return goal_x, goal_y
+            cx, cy = self.grid.center(cell)
+            if self.grid.is_clear(cx, cy, goal_x, goal_y):
+                break
+        return self.grid.center(cell)
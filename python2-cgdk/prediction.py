@@ -1,9 +1,9 @@
 import math
+import cmath
+from array import array
 
 from model.ShellType import ShellType
-from model.Unit import Unit
 from model.Tank import Tank
-from model.Shell import Shell
 
 import geometry
 import utils
@@ -14,88 +14,89 @@ REGULAR_COEFF = 0.995
 PREMIUM_COEFF = 0.99
 
 
-def next_shell(shell, world, tick=1):
-    new_x = shell.x
-    new_y = shell.y
-    new_speed_x = shell.speedX
-    new_speed_y = shell.speedY
+def drag_coeff(shell):
+    if shell.type == ShellType.REGULAR:
+        return REGULAR_COEFF
+    return PREMIUM_COEFF
 
-    for i in range(tick):
-        new_x = new_x + new_speed_x
-        new_y = new_y + new_speed_y
-        if shell.type == ShellType.REGULAR:
-            new_speed_x = new_speed_x * REGULAR_COEFF
-            new_speed_y = new_speed_y * REGULAR_COEFF
-        else:
-            new_speed_x = new_speed_x * PREMIUM_COEFF
-            new_speed_y = new_speed_y * PREMIUM_COEFF
 
-    new_shell = Shell(id=shell.id, player_name=shell.player_name, width=shell.width, height=shell.height,
-            x=new_x,
-            y=new_y,
-            speed_x=new_speed_x,
-            speed_y=new_speed_y,
-            angle=shell.angle, angular_speed=shell.angular_speed, type=shell.type)
-    return new_shell
+def travel_factor(coeff, tick):
+    '''1 + coeff + ... + coeff ** (tick - 1): path in tick ticks per unit of the start speed'''
+    return (1. - coeff ** tick) / (1. - coeff)
+
+
+class ShellState:
+    '''shell position and speed after some ticks, enough for distances and blocking checks'''
+    __slots__ = ['x', 'y', 'speedX', 'speedY']
+
+    def __init__(self, x, y, speed_x, speed_y):
+        self.x = x
+        self.y = y
+        self.speedX = speed_x
+        self.speedY = speed_y
+
+
+def shell_state(shell, tick):
+    '''constant time, speed decays geometrically by the drag coefficient every tick'''
+    coeff = drag_coeff(shell)
+    factor = travel_factor(coeff, tick)
+    decay = coeff ** tick
+    return ShellState(shell.x + shell.speedX * factor, shell.y + shell.speedY * factor,
+            shell.speedX * decay, shell.speedY * decay)
+
+
+def propagate_shells(shells, tick):
+    '''x, y, speed x, speed y of every shell after tick ticks as array('d') columns'''
+    factors = {}
+    for coeff in (REGULAR_COEFF, PREMIUM_COEFF):
+        factors[coeff] = (travel_factor(coeff, tick), coeff ** tick)
+    xs, ys, speeds_x, speeds_y = array('d'), array('d'), array('d'), array('d')
+    for shell in shells:
+        factor, decay = factors[drag_coeff(shell)]
+        xs.append(shell.x + shell.speedX * factor)
+        ys.append(shell.y + shell.speedY * factor)
+        speeds_x.append(shell.speedX * decay)
+        speeds_y.append(shell.speedY * decay)
+    return xs, ys, speeds_x, speeds_y
+
+
+# shell paths are followed this many ticks
+SHELL_PATH_TICKS = 200
+
+
+def get_shell_path_ends(world):
+    '''shell id -> (x, y) of the shell after SHELL_PATH_TICKS ticks, all shells of the tick at once'''
+    def compute():
+        xs, ys, speeds_x, speeds_y = propagate_shells(world.shells, SHELL_PATH_TICKS)
+        return dict((shell.id, (x, y)) for shell, x, y in zip(world.shells, xs, ys))
+    return utils.get_tick_context(world).memoize('shell_path_ends', compute)
 
 
 def cross_boundaries(tank, world):
     tank_borders = utils.get_borders(tank)
 
-    for world_border in utils.get_world_borders():
-        for tank_border in tank_borders:
-            x1, y1, x2, y2 = tank_border
-            if geometry.are_intervals_intersect(x1, y1, x2, y2, *world_border):
-                return True
-
-    def can_cross(unit):
-        unit_size = math.hypot(unit.width / 2., unit.height / 2.)
-        tank_size = math.hypot(tank.width / 2., tank.height / 2.)
-        return unit_size + tank_size > math.hypot(unit.x - tank.x, unit.y - tank.y)
-
-    # for unit in world.obstacles:
-    # for unit in world.obstacles + utils.other_tanks(world, tank):
-    for unit in filter(lambda u: can_cross(u), world.obstacles + utils.other_tanks(world, tank)):
-        for border in utils.get_borders(unit):
-            for tank_border in tank_borders:
-                x1, y1, x2, y2 = tank_border
-                if geometry.are_intervals_intersect(x1, y1, x2, y2, *border):
-                    return True
-
-    return False
+    if geometry.any_intervals_intersect(tank_borders, utils.get_static_map(world).world_borders):
+        return True
 
+    index = utils.get_blocker_index(world)
+    r = math.hypot(tank.width / 2., tank.height / 2.)
+    x_min, y_min, x_max, y_max = tank.x - r, tank.y - r, tank.x + r, tank.y + r
 
-def next_tank(tank, world, move_left, move_right, tick=1):
-    if move_left < 0:
-        move_left *= 0.75
+    for unit in index.query_box('obstacles', x_min, y_min, x_max, y_max):
+        if utils.are_overlapping(tank, unit):
+            return True
 
-    if move_right < 0:
-        move_right *= 0.75
+    for other in index.query_box('tanks', x_min, y_min, x_max, y_max):
+        if other.id != tank.id and utils.are_overlapping(tank, other):
+            return True
 
-    move_left *= utils.life_factor(tank)
-    move_right *= utils.life_factor(tank)
+    return False
 
-    angle_a = 0.000627876445651 / 1.5
-    a = 0.1
 
-    nsx = tank.speedX
-    nsy = tank.speedY
-    nx = tank.x
-    ny = tank.y
-    nsa = tank.angular_speed
-    na = tank.angle
-
-    for i in range(tick):
-        nx = nx + nsx
-        ny = ny + nsy
-        nsx = nsx + a * (move_right + move_left) * math.cos(na)
-        nsy = nsy + a * (move_right + move_left) * math.sin(na)
-        na = na + nsa
-        nsa = nsa + angle_a * (move_left - move_right)
-
-    new = Tank(tank.id,
-            x=nx, y=ny,
-            speed_x=nsx, speed_y=nsy, angle=na, angular_speed=nsa,
+def moved_tank(tank, x, y, speed_x, speed_y, angle, angular_speed):
+    return Tank(tank.id,
+            x=x, y=y,
+            speed_x=speed_x, speed_y=speed_y, angle=angle, angular_speed=angular_speed,
             player_name=tank.player_name,
             teammate_index=tank.teammate_index,
             turret_relative_angle=tank.turret_relative_angle,
@@ -108,50 +109,328 @@ def next_tank(tank, world, move_left, move_right, tick=1):
             type=tank.type
             )
 
-    if cross_boundaries(new, world):
-        new.x = tank.x
-        new.y = tank.y
-    return new
-
-
-def touch_next_tick(shell, next_shell, tank):
-    return utils.is_goal_blocked_by(shell, next_shell, tank)
 
+def track_accelerations(tank, move_left, move_right):
+    '''(linear, angular) acceleration for the track powers'''
+    if move_left < 0:
+        move_left *= 0.75
 
-def damage(tank, shell, world, move_left, move_right):
-    '''return damage if tank will use move_left/move_right move strategy'''
-    if math.hypot(shell.speedX, shell.speedY) < 1.:
-        return 0.
+    if move_right < 0:
+        move_right *= 0.75
 
-    tank_prev = tank
-    shell_prev = shell
-    dist_prev = tank_prev.get_distance_to_unit(shell_prev)
+    move_left *= utils.life_factor(tank)
+    move_right *= utils.life_factor(tank)
 
-    tank_next = next_tank(tank_prev, world, move_left, move_right)
-    shell_next = next_shell(shell_prev, world)
-    dist_next = tank_next.get_distance_to_unit(shell_next)
+    angle_a = 0.000627876445651 / 1.5
+    a = 0.1
+    return a * (move_right + move_left), angle_a * (move_left - move_right)
+
+
+# below this angular speed the phase sums are expanded in a series up to angular_speed ** 2
+SERIES_ANGULAR_SPEED = 1e-6
+
+
+def phase_sums(angle, angular_speed, angular_acceleration, tick):
+    '''C = sum u_k and D = sum k * u_k over k < tick, u_k = exp(i * angle_k), where
+    angle_k = angle + k * angular_speed + angular_acceleration * k * (k - 1) / 2
+    constant time without angular acceleration, otherwise summed term by term
+    '''
+    if angular_acceleration == 0.:
+        u = cmath.exp(1j * angle)
+        w = angular_speed
+        if abs(w) < SERIES_ANGULAR_SPEED:
+            # exp(i * k * w) ~ 1 + i * k * w - (k * w) ** 2 / 2, exact for w == 0
+            s1 = tick * (tick - 1) / 2.
+            s2 = (tick - 1) * tick * (2 * tick - 1) / 6.
+            s3 = s1 * s1
+            c = u * complex(tick - w * w * s2 / 2., w * s1)
+            d = u * complex(s1 - w * w * s3 / 2., w * s2)
+            return c, d
+        # 1 - exp(i * x) without the cancellation of 1 - cos(x)
+        def one_minus_exp(x):
+            return complex(2. * math.sin(x / 2.) ** 2, -math.sin(x))
+        r = cmath.exp(1j * w)
+        one_minus_r = one_minus_exp(w)
+        c = u * one_minus_exp(tick * w) / one_minus_r
+        # D = (r + ... + r ** (tick - 1) - (tick - 1) * r ** tick) / (1 - r)
+        g = r * one_minus_exp((tick - 1) * w) / one_minus_r
+        d = u * (g - (tick - 1) * cmath.exp(1j * tick * w)) / one_minus_r
+        return c, d
+    c = d = 0j
+    for k in xrange(tick):
+        u = cmath.exp(1j * (angle + k * angular_speed + angular_acceleration * k * (k - 1) / 2.))
+        c += u
+        d += k * u
+    return c, d
+
+
+def pose_from_sums(tank, acceleration, angular_acceleration, tick, c, d):
+    '''(x, y, speed_x, speed_y, angle, angular_speed) after tick ticks
+    speed is s0 + A * C and position x0 + tick * s0 + A * ((tick - 1) * C - D)
+    '''
+    speed = complex(tank.speedX, tank.speedY) + acceleration * c
+    position = complex(tank.x, tank.y) + tick * complex(tank.speedX, tank.speedY) + \
+            acceleration * ((tick - 1) * c - d)
+    angle = tank.angle + tick * tank.angular_speed + angular_acceleration * tick * (tick - 1) / 2.
+    angular_speed = tank.angular_speed + tick * angular_acceleration
+    return position.real, position.imag, speed.real, speed.imag, angle, angular_speed
+
+
+def tank_pose(tank, move_left, move_right, tick=1):
+    '''free motion of next_tank (no boundaries) as a tuple
+    constant time for equal track powers, otherwise linear in tick, see TankMotion
+    '''
+    acceleration, angular_acceleration = track_accelerations(tank, move_left, move_right)
+    c, d = phase_sums(tank.angle, tank.angular_speed, angular_acceleration, tick)
+    return pose_from_sums(tank, acceleration, angular_acceleration, tick, c, d)
+
+
+class TankPose:
+    '''tank position and speed on a trajectory, enough for impact checks'''
+    __slots__ = ['x', 'y', 'speedX', 'speedY', 'angle', 'angular_speed', 'width', 'height']
+
+    def __init__(self, x, y, speed_x, speed_y, angle, angular_speed, width, height):
+        self.x = x
+        self.y = y
+        self.speedX = speed_x
+        self.speedY = speed_y
+        self.angle = angle
+        self.angular_speed = angular_speed
+        self.width = width
+        self.height = height
+
+
+class TankMotion:
+    '''free motion of a tank under several (move_left, move_right) actions
+    columns[index] - x, y, speed x, speed y, angle, angular speed of action index
+    by tick as array('d') columns, filled up to the longest tick asked for
+    '''
+    def __init__(self, tank, actions):
+        self.tank = tank
+        self.actions = actions
+        self.accelerations = [track_accelerations(tank, l, r) for l, r in actions]
+        # per action: C and D of the last tick
+        self.sums = [(0j, 0j) for action in actions]
+        self.columns = []
+        for action in actions:
+            columns = [array('d') for i in xrange(6)]
+            for column, value in zip(columns, (tank.x, tank.y, tank.speedX, tank.speedY,
+                    tank.angle, tank.angular_speed)):
+                column.append(value)
+            self.columns.append(columns)
+
+    def extend(self, tick):
+        '''columns of every action up to tick'''
+        if len(self.columns[0][0]) > tick:
+            return
+        for index, (acceleration, angular_acceleration) in enumerate(self.accelerations):
+            c, d = self.sums[index]
+            columns = self.columns[index]
+            for k in xrange(len(columns[0]) - 1, tick):
+                u = cmath.exp(1j * (self.tank.angle + k * self.tank.angular_speed +
+                        angular_acceleration * k * (k - 1) / 2.))
+                c += u
+                d += k * u
+                for column, value in zip(columns, pose_from_sums(
+                        self.tank, acceleration, angular_acceleration, k + 1, c, d)):
+                    column.append(value)
+            self.sums[index] = (c, d)
+
+    def pose(self, index, tick):
+        '''(x, y, speed_x, speed_y, angle, angular_speed) of action index after tick ticks'''
+        self.extend(tick)
+        return tuple(column[tick] for column in self.columns[index])
 
-    if touch_next_tick(shell, shell_next, tank_next):
-        return assessments.shell_damage(shell, tank_next)
 
-    while (dist_next < dist_prev):
-        if dist_next / constants.SHELL_AVERAGE_SPEED > 10:
-            tick_count = 5
-        else:
-            tick_count = 1
+def next_tank(tank, world, move_left, move_right, tick=1):
+    new = moved_tank(tank, *tank_pose(tank, move_left, move_right, tick))
 
-        shell_prev = shell_next
-        tank_prev = tank_next
-        dist_prev = dist_next
+    if cross_boundaries(new, world):
+        new.x = tank.x
+        new.y = tank.y
+    return new
 
-        tank_next = next_tank(tank_prev, world, move_left, move_right, tick_count)
-        shell_next = next_shell(shell_prev, world, tick_count)
-        dist_next = tank_next.get_distance_to_unit(shell_next)
 
-        if touch_next_tick(shell, shell_next, tank_next):
-            return assessments.shell_damage(shell, tank_next)
+class Rollout:
+    '''trajectories of a tank under several (move_left, move_right) actions
+
+    free motion is read from the columns of one TankMotion; a Tank is built
+    only for a boundary check, and the checks are shared by every shell
+    scored against the trajectories
+    '''
+    def __init__(self, tank, world, actions):
+        self.tank = tank
+        self.world = world
+        self.actions = actions
+        self.motion = TankMotion(tank, actions)
+        self.crossings = {}
+
+    def pose_at(self, index, t):
+        self.motion.extend(t)
+        x, y, speeds_x, speeds_y, angles, angular_speeds = self.motion.columns[index]
+        return TankPose(x[t], y[t], speeds_x[t], speeds_y[t], angles[t], angular_speeds[t],
+                self.tank.width, self.tank.height)
+
+    def crosses(self, index, t):
+        key = (index, t)
+        res = self.crossings.get(key)
+        if res is None:
+            res = cross_boundaries(moved_tank(self.tank, *self.motion.pose(index, t)), self.world)
+            self.crossings[key] = res
+        return res
+
+    def advance(self, index, t, tank, tick):
+        '''next_tank(tank, ..., tick) for tank at tick t of trajectory index (None when off it)
+        return (next tank or TankPose, its tick on the trajectory or None)
+        '''
+        if t is None:
+            move_left, move_right = self.actions[index]
+            return next_tank(tank, self.world, move_left, move_right, tick), None
+        t += tick
+        if not self.crosses(index, t):
+            return self.pose_at(index, t), t
+        # stopped by a boundary, the rest is not on the free trajectory
+        next_free = self.pose_at(index, t)
+        return moved_tank(self.tank, tank.x, tank.y, next_free.speedX, next_free.speedY,
+                next_free.angle, next_free.angular_speed), None
+
+
+# half thickness of a shell
+IMPACT_MARGIN = constants.SHELL_HEIGHT / 2.
+# edges are measured on a slightly larger tank, pessimistic about hits near the corners
+IMPACT_EDGE_SCALE = 1.1
+MAX_IMPACT_TICK = 200
+MAX_IMPACT_STEP = 5
+
+FRONT, RIGHT, BACK, LEFT = range(4)
+
+
+class Contact:
+    '''first contact of a shell with a tank
+    tick - fractional tick of the contact
+    edge - FRONT, RIGHT, BACK or LEFT
+    angle - between shell path and the edge normal, in radians
+    dist_factor - from the middle of the edge 0. to its end 1.
+    '''
+    __slots__ = ['tick', 'edge', 'angle', 'dist_factor']
+
+    def __init__(self, tick, edge, angle, dist_factor):
+        self.tick = tick
+        self.edge = edge
+        self.angle = angle
+        self.dist_factor = dist_factor
+
+
+def box_entry(u0, v0, du, dv, half_width, half_height):
+    '''(s, edge) where the segment (u0, v0) + s * (du, dv), 0 <= s <= 1 enters the
+    box |u| <= half_width, |v| <= half_height given in its own frame, None if it does not
+    '''
+    enter, exit = 0., 1.
+    edge = None
+    for p, d, half, positive_edge, negative_edge in ((u0, du, half_width, FRONT, BACK),
+            (v0, dv, half_height, LEFT, RIGHT)):
+        if d == 0.:
+            if abs(p) > half:
+                return None
+            continue
+        s1 = (-half - p) / d
+        s2 = (half - p) / d
+        # entering through the side the segment comes from
+        side = positive_edge if d < 0. else negative_edge
+        if s1 > s2:
+            s1, s2 = s2, s1
+        if s1 > enter:
+            enter, edge = s1, side
+        exit = min(exit, s2)
+        if enter > exit:
+            return None
+    if edge is None:
+        # starts inside, the nearest side is hit
+        depths = [(half_width - u0, FRONT), (half_width + u0, BACK),
+                (half_height - v0, LEFT), (half_height + v0, RIGHT)]
+        edge = min(depths)[1]
+    return enter, edge
+
+
+def contact_with(tank_prev, tank_next, shell_prev, shell_next, shell, tick):
+    '''Contact within one tick, both moves taken as straight, tank in its next pose'''
+    vx = math.cos(tank_next.angle)
+    vy = math.sin(tank_next.angle)
+    # box frame: u along the tank, v along its left normal (vy, -vx)
+    qx = shell_prev.x - tank_prev.x
+    qy = shell_prev.y - tank_prev.y
+    dx = (shell_next.x - tank_next.x) - qx
+    dy = (shell_next.y - tank_next.y) - qy
+    half_width = tank_next.width / 2. + IMPACT_MARGIN
+    half_height = tank_next.height / 2. + IMPACT_MARGIN
+    entry = box_entry(qx * vx + qy * vy, qx * vy - qy * vx, dx * vx + dy * vy, dx * vy - dy * vx,
+            half_width, half_height)
+    if entry is None:
+        return None
+    s, edge = entry
+
+    u = qx * vx + qy * vy + s * (dx * vx + dy * vy)
+    v = qx * vy - qy * vx + s * (dx * vy - dy * vx)
+    su = shell.speedX * vx + shell.speedY * vy
+    sv = shell.speedX * vy - shell.speedY * vx
+    if edge in (FRONT, BACK):
+        angle = math.atan2(abs(sv), abs(su))
+        offset, half_length = v, IMPACT_EDGE_SCALE * tank_next.height / 2.
+    else:
+        angle = math.atan2(abs(su), abs(sv))
+        offset, half_length = u, IMPACT_EDGE_SCALE * tank_next.width / 2.
+    return Contact(tick + s, edge, angle, min(1., abs(offset) / half_length))
+
+
+def time_of_impact(tank, shell, world, rollout, action_index, max_tick=MAX_IMPACT_TICK):
+    '''first Contact of shell with tank moving along rollout action, None without one
+
+    near the tank every tick is tested continuously; farther away whole ticks
+    are skipped while the shell cannot reach the tank even heading straight at
+    it, and the search stops once they move apart beyond reach
+    '''
+    radius = math.hypot(tank.width / 2., tank.height / 2.) + IMPACT_MARGIN
+    tank_prev, t = tank, 0
+    shell_prev = ShellState(shell.x, shell.y, shell.speedX, shell.speedY)
+    tick = 0
+    while tick < max_tick:
+        distance = math.hypot(shell_prev.x - tank_prev.x, shell_prev.y - tank_prev.y)
+        shell_speed = math.hypot(shell_prev.speedX, shell_prev.speedY)
+        # tank accelerates by at most 0.2 per tick, so 1. covers it for MAX_IMPACT_STEP ticks
+        closing_speed = shell_speed + math.hypot(tank_prev.speedX, tank_prev.speedY) + 1.
+        step = max(1, min(MAX_IMPACT_STEP, int((distance - radius) / closing_speed)))
+
+        tank_next, t = rollout.advance(action_index, t, tank_prev, step)
+        shell_next = shell_state(shell, tick + step)
+        if step == 1:
+            contact = contact_with(tank_prev, tank_next, shell_prev, shell_next, shell, tick)
+            if contact is not None:
+                return contact
+
+        rx = shell_next.x - tank_next.x
+        ry = shell_next.y - tank_next.y
+        moving_apart = rx * (shell_next.speedX - tank_next.speedX) + \
+                ry * (shell_next.speedY - tank_next.speedY) > 0.
+        if moving_apart and math.hypot(rx, ry) > radius:
+            return None
+
+        tank_prev, shell_prev = tank_next, shell_next
+        tick += step
+    return None
+
+
+def damage(tank, shell, world, move_left, move_right, rollout=None, action_index=None):
+    '''return damage if tank will use move_left/move_right move strategy
+    rollout of tank holding the action at action_index shares the tank trajectory
+    '''
+    if math.hypot(shell.speedX, shell.speedY) < 1.:
+        return 0.
 
-        if assessments.shell_damage(shell, tank_next) < 0.0001:
-            return 0.
+    if rollout is None:
+        rollout = Rollout(tank, world, [(move_left, move_right)])
+        action_index = 0
 
-    return 0.
+    contact = time_of_impact(tank, shell, world, rollout, action_index)
+    if contact is None:
+        return 0.
+    return assessments.shell_damage(shell, contact)
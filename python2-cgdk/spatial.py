@@ -0,0 +1,309 @@
+'''
+Uniform grids over the world: nearby unit lookups and static line of sight
+'''
+
+import math
+import struct
+from array import array
+
+import constants
+
+CELL_SIZE = 80.
+
+# cell size, columns, rows, item count
+GRID_HEADER_STRUCT = struct.Struct('<diii')
+
+
+class SpatialGrid:
+    '''items are stored in every cell their bounding box touches'''
+    def __init__(self, width=constants.WORLD_WIDTH, height=constants.WORLD_HEIGHT, cell_size=CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self.columns = int(math.ceil(width / self.cell_size))
+        self.rows = int(math.ceil(height / self.cell_size))
+        self.cells = [[] for i in xrange(self.columns * self.rows)]
+        self.size = 0
+
+    def column(self, x):
+        return min(self.columns - 1, max(0, int(x / self.cell_size)))
+
+    def row(self, y):
+        return min(self.rows - 1, max(0, int(y / self.cell_size)))
+
+    def insert(self, item, x_min, y_min, x_max, y_max):
+        for i in xrange(self.column(x_min), self.column(x_max) + 1):
+            for j in xrange(self.row(y_min), self.row(y_max) + 1):
+                self.cells[i * self.rows + j].append(item)
+        self.size += 1
+
+    def insert_unit(self, item, unit):
+        r = math.hypot(unit.width / 2., unit.height / 2.)
+        self.insert(item, unit.x - r, unit.y - r, unit.x + r, unit.y + r)
+
+    def query_box(self, x_min, y_min, x_max, y_max):
+        res = set()
+        if not self.size:
+            return res
+        for i in xrange(self.column(x_min), self.column(x_max) + 1):
+            for j in xrange(self.row(y_min), self.row(y_max) + 1):
+                res.update(self.cells[i * self.rows + j])
+        return res
+
+    def dump(self):
+        '''bytes for load_grid, items must be ints'''
+        counts = array('i', [len(cell) for cell in self.cells])
+        items = array('i', [item for cell in self.cells for item in cell])
+        return GRID_HEADER_STRUCT.pack(self.cell_size, self.columns, self.rows, self.size) + \
+                counts.tostring() + items.tostring()
+
+    def query_segment(self, x1, y1, x2, y2, margin):
+        '''items in the cells crossed by the segment widened by margin on every side'''
+        res = set()
+        if not self.size:
+            return res
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        dx = x2 - x1
+        dy = y2 - y1
+        for i in xrange(self.column(x1 - margin), self.column(x2 + margin) + 1):
+            # part of the segment within the widened column, outer columns extend to infinity
+            left = x1 if i == 0 else max(x1, i * self.cell_size - margin)
+            right = x2 if i == self.columns - 1 else min(x2, (i + 1) * self.cell_size + margin)
+            if dx > 0.:
+                ya = y1 + dy * (left - x1) / dx
+                yb = y1 + dy * (right - x1) / dx
+            else:
+                ya, yb = y1, y2
+            for j in xrange(self.row(min(ya, yb) - margin), self.row(max(ya, yb) + margin) + 1):
+                res.update(self.cells[i * self.rows + j])
+        return res
+
+
+def load_grid(data, width=constants.WORLD_WIDTH, height=constants.WORLD_HEIGHT):
+    '''SpatialGrid packed by dump, None when it does not fit the world'''
+    cell_size, columns, rows, size = GRID_HEADER_STRUCT.unpack_from(data, 0)
+    grid = SpatialGrid(width, height, cell_size)
+    if (grid.columns, grid.rows) != (columns, rows):
+        return None
+    counts = array('i')
+    counts.fromstring(data[GRID_HEADER_STRUCT.size:GRID_HEADER_STRUCT.size + counts.itemsize * len(grid.cells)])
+    items = array('i')
+    items.fromstring(data[GRID_HEADER_STRUCT.size + counts.itemsize * len(grid.cells):])
+    if len(counts) != len(grid.cells) or sum(counts) != len(items):
+        return None
+    offset = 0
+    for index, count in enumerate(counts):
+        grid.cells[index] = items[offset:offset + count].tolist()
+        offset += count
+    grid.size = size
+    return grid
+
+
+SIGHT_CELL_SIZE = 20.
+
+# cell size, width, height, margin
+SIGHT_HEADER_STRUCT = struct.Struct('<dddd')
+
+
+class SightTable:
+    '''static line of sight between quantised cells
+    bit b of row a is set when no blocker comes near any segment from a point
+    of cell a to a point of cell b; rows are computed on first use, blockers
+    are circles; patches are blockers that come and go (dead tanks), a computed
+    row takes the patches added since on its next lookup, a moved or dropped
+    patch makes every row stale
+    '''
+    def __init__(self, margin, width=constants.WORLD_WIDTH, height=constants.WORLD_HEIGHT,
+            cell_size=SIGHT_CELL_SIZE):
+        self.cell_size = float(cell_size)
+        self.width = width
+        self.height = height
+        self.columns = int(math.ceil(width / self.cell_size))
+        self.rows = int(math.ceil(height / self.cell_size))
+        self.cell_count = self.columns * self.rows
+        self.row_size = (self.cell_count + 7) / 8
+        # segments between cell centers stand for segments between any cell points
+        self.cell_radius = self.cell_size * math.sqrt(2.) / 2.
+        self.margin = margin + self.cell_radius
+        self.centers = [((i + 0.5) * self.cell_size, (j + 0.5) * self.cell_size)
+                for i in xrange(self.columns) for j in xrange(self.rows)]
+        self.bits = bytearray(self.cell_count * self.row_size)
+        self.known = bytearray(self.cell_count)
+        self.known_count = 0
+        self.dumped_count = 0
+        self.blockers = []
+        # blockers by key and in the order they were added
+        self.patches = {}
+        self.patch_blockers = []
+        # patch blockers taken by the row
+        self.applied = array('i', [0]) * self.cell_count
+
+    def cell(self, x, y):
+        '''cell index or -1 outside the world'''
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return -1
+        return int(x / self.cell_size) * self.rows + int(y / self.cell_size)
+
+    def is_segment_clear(self, ax, ay, bx, by, blocker):
+        ox, oy, r = blocker
+        vx = bx - ax
+        vy = by - ay
+        ll = vx * vx + vy * vy
+        px = ox - ax
+        py = oy - ay
+        t = 0.
+        if ll > 0.:
+            t = min(1., max(0., (px * vx + py * vy) / ll))
+        dx = px - t * vx
+        dy = py - t * vy
+        return dx * dx + dy * dy > r * r
+
+    def blocked_ranges(self, a, blocker):
+        '''(first, last + 1) cell index ranges of row a hidden by blocker
+
+        cells B with segment AB meeting the disc form a convex region (the disc
+        and its shadow), so each column holds one range bounded by the disc,
+        the tangent rays from A or the world border
+        '''
+        ax, ay = self.centers[a]
+        ox, oy, r = blocker
+        d = math.hypot(ox - ax, oy - ay)
+        if d <= r:
+            return [(0, self.cell_count)]
+
+        a_column = a / self.rows
+        phi = math.atan2(oy - ay, ox - ax)
+        alpha = math.asin(r / d)
+        tangent = math.sqrt(d * d - r * r)
+        rays = [(math.cos(phi + alpha), math.sin(phi + alpha)), (math.cos(phi - alpha), math.sin(phi - alpha))]
+        # a column is hidden up to infinity when the shadow cone holds its direction
+        up = abs(math.atan2(math.sin(math.pi / 2. - phi), math.cos(math.pi / 2. - phi))) <= alpha
+        down = abs(math.atan2(math.sin(-math.pi / 2. - phi), math.cos(-math.pi / 2. - phi))) <= alpha
+
+        res = []
+        for i in xrange(self.columns):
+            base = i * self.rows
+            if i == a_column:
+                # rays cross the own column only in A, test its cells one by one
+                for j in xrange(self.rows):
+                    bx, by = self.centers[base + j]
+                    if not self.is_segment_clear(ax, ay, bx, by, blocker):
+                        res.append((base + j, base + j + 1))
+                continue
+            bx = (i + 0.5) * self.cell_size
+            ys = []
+            if abs(bx - ox) <= r:
+                s = math.sqrt(r * r - (bx - ox) ** 2)
+                ys.extend([oy - s, oy + s])
+            for ux, uy in rays:
+                if ux != 0.:
+                    k = (bx - ax) / ux
+                    if k >= tangent:
+                        ys.append(ay + k * uy)
+            if not ys:
+                continue
+            if up:
+                ys.append(self.height)
+            if down:
+                ys.append(0.)
+            first = max(0, int(math.ceil(min(ys) / self.cell_size - 0.5)))
+            last = min(self.rows - 1, int(math.floor(max(ys) / self.cell_size - 0.5)))
+            if first <= last:
+                res.append((base + first, base + last + 1))
+        return res
+
+    def compute_row(self, a):
+        flags = bytearray('1') * self.cell_count
+        for blocker in self.blockers + self.patch_blockers:
+            for start, stop in self.blocked_ranges(a, blocker):
+                flags[start:stop] = '0' * (stop - start)
+        # bit b of the row is flag b
+        value = int(str(flags[::-1]), 2)
+        row = ('%0*x' % (2 * self.row_size, value)).decode('hex')[::-1]
+        self.bits[a * self.row_size:(a + 1) * self.row_size] = row
+        self.known[a] = 1
+        self.known_count += 1
+        self.applied[a] = len(self.patch_blockers)
+
+    def clear_bits(self, a, start, stop):
+        '''clear bits start to stop - 1 of row a, whole bytes at once'''
+        offset = a * self.row_size
+        first = (start + 7) >> 3
+        last = stop >> 3
+        if first > last:
+            # the range is within a byte
+            self.bits[offset + last] &= ~((1 << (stop & 7)) - (1 << (start & 7))) & 0xff
+            return
+        if start & 7:
+            self.bits[offset + first - 1] &= (1 << (start & 7)) - 1
+        self.bits[offset + first:offset + last] = bytearray(last - first)
+        if stop & 7:
+            self.bits[offset + last] &= ~((1 << (stop & 7)) - 1) & 0xff
+
+    def clear_blocker(self, a, blocker):
+        for start, stop in self.blocked_ranges(a, blocker):
+            self.clear_bits(a, start, stop)
+
+    def add_blocker(self, x, y, radius):
+        blocker = (x, y, radius + self.margin)
+        self.blockers.append(blocker)
+        for a in xrange(self.cell_count):
+            if self.known[a]:
+                self.clear_blocker(a, blocker)
+
+    def update_row(self, a):
+        '''compute row a or apply the patches it misses'''
+        if not self.known[a]:
+            self.compute_row(a)
+            return
+        for blocker in self.patch_blockers[self.applied[a]:]:
+            self.clear_blocker(a, blocker)
+        self.applied[a] = len(self.patch_blockers)
+
+    def dump(self):
+        '''computed rows, for restore'''
+        self.dumped_count = self.known_count
+        return SIGHT_HEADER_STRUCT.pack(self.cell_size, self.width, self.height, self.margin) + \
+                str(self.known) + str(self.bits)
+
+    def restore(self, data):
+        '''take rows from dump of a table with the same blockers, False when it does not fit'''
+        header = (self.cell_size, self.width, self.height, self.margin)
+        if len(data) != SIGHT_HEADER_STRUCT.size + len(self.known) + len(self.bits) or \
+                SIGHT_HEADER_STRUCT.unpack_from(data, 0) != header:
+            return False
+        offset = SIGHT_HEADER_STRUCT.size
+        self.known = bytearray(data[offset:offset + self.cell_count])
+        self.bits = bytearray(data[offset + self.cell_count:])
+        self.known_count = self.dumped_count = self.known.count('\x01')
+        return True
+
+    def set_patches(self, circles):
+        '''circles - (x, y, radius) by key of all the patches there should be
+        a circle stands for any place within its cell, so moves inside the cell
+        keep the patch as it is
+        '''
+        patches = {}
+        for key, (x, y, radius) in circles.iteritems():
+            i = min(self.columns - 1, max(0, int(x / self.cell_size)))
+            j = min(self.rows - 1, max(0, int(y / self.cell_size)))
+            patches[key] = self.centers[i * self.rows + j] + (radius + self.margin + self.cell_radius,)
+        if any(patches.get(key) != blocker for key, blocker in self.patches.iteritems()):
+            self.patches = {}
+            self.patch_blockers = []
+            self.known = bytearray(self.cell_count)
+            self.known_count = 0
+        for key in sorted(patches):
+            if key not in self.patches:
+                self.patches[key] = patches[key]
+                self.patch_blockers.append(patches[key])
+
+    def is_clear(self, x1, y1, x2, y2):
+        '''True when no blocker can be near the segment, False when unsure'''
+        a = self.cell(x1, y1)
+        b = self.cell(x2, y2)
+        if a < 0 or b < 0:
+            return False
+        if not self.known[a] and self.known[b]:
+            a, b = b, a
+        self.update_row(a)
+        return bool(self.bits[a * self.row_size + (b >> 3)] & (1 << (b & 7)))
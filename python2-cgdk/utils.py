@@ -2,42 +2,87 @@
 Precise functions without any heuristics
 '''
 
+from array import array
+
+from model.Obstacle import Obstacle
 from model.Unit import Unit
 
 from geometry import *
 import geometry
 from constants import *
 import constants
+import spatial
+import mapcache
+import navigation
+
+
+class UnitGeometry:
+    '''derived geometry of a unit in its current state'''
+    def __init__(self, unit):
+        vx = math.cos(unit.angle)
+        vy = math.sin(unit.angle)
+        nvx = vy
+        nvy = -vx
+
+        # l - left, f = front, r - right, b - back
+        lf_x = unit.x + (unit.width * vx + unit.height * nvx) / 2.
+        lf_y = unit.y + (unit.width * vy + unit.height * nvy) / 2.
+
+        rf_x = unit.x + (unit.width * vx - unit.height * nvx) / 2.
+        rf_y = unit.y + (unit.width * vy - unit.height * nvy) / 2.
+
+        lb_x = unit.x + (-unit.width * vx + unit.height * nvx) / 2.
+        lb_y = unit.y + (-unit.width * vy + unit.height * nvy) / 2.
+
+        rb_x = unit.x + (-unit.width * vx - unit.height * nvx) / 2.
+        rb_y = unit.y + (-unit.width * vy - unit.height * nvy) / 2.
+
+        self.vx, self.vy = vx, vy
+        self.nvx, self.nvy = nvx, nvy
+        self.corners = [(lf_x, lf_y), (rf_x, rf_y), (rb_x, rb_y), (lb_x, lb_y)]
+        # front, right, back, left
+        self.borders = [
+                (lf_x, lf_y, rf_x, rf_y),
+                (rf_x, rf_y, rb_x, rb_y),
+                (rb_x, rb_y, lb_x, lb_y),
+                (lb_x, lb_y, lf_x, lf_y)]
+        self.radius = math.hypot(unit.width / 2., unit.height / 2.)
+        self.box = (unit.x, unit.y, vx, vy, unit.width / 2., unit.height / 2.)
+
+
+# geometry depends only on the state, so the state is the key and a moved
+# unit simply misses; obstacles never move and are kept for the whole game
+_geometry_cache = {}
+_static_geometry_cache = {}
+GEOMETRY_CACHE_LIMIT = 4096
+
+
+def get_geometry(unit):
+    key = (unit.x, unit.y, unit.angle, unit.width, unit.height)
+    static = isinstance(unit, Obstacle)
+    cache = _static_geometry_cache if static else _geometry_cache
+    unit_geometry = cache.get(key)
+    if unit_geometry is None:
+        if not static and len(cache) >= GEOMETRY_CACHE_LIMIT:
+            cache.clear()
+        unit_geometry = UnitGeometry(unit)
+        cache[key] = unit_geometry
+    return unit_geometry
 
 
 def get_borders(unit):
-    vx = math.cos(unit.angle)
-    vy = math.sin(unit.angle)
-    nvx = vy
-    nvy = -vx
+    return get_geometry(unit).borders
 
-    # l - left, f = front, r - right, b - back
-    lf_x = unit.x + (unit.width * vx + unit.height * nvx) / 2.
-    lf_y = unit.y + (unit.width * vy + unit.height * nvy) / 2.
 
-    rf_x = unit.x + (unit.width * vx - unit.height * nvx) / 2.
-    rf_y = unit.y + (unit.width * vy - unit.height * nvy) / 2.
+def are_overlapping(unit1, unit2):
+    geometry1 = get_geometry(unit1)
+    geometry2 = get_geometry(unit2)
+    if math.hypot(unit1.x - unit2.x, unit1.y - unit2.y) > geometry1.radius + geometry2.radius:
+        return False
+    return geometry.are_boxes_overlapping(geometry1.box, geometry2.box)
 
-    lb_x = unit.x + (-unit.width * vx + unit.height * nvx) / 2.
-    lb_y = unit.y + (-unit.width * vy + unit.height * nvy) / 2.
 
-    rb_x = unit.x + (-unit.width * vx - unit.height * nvx) / 2.
-    rb_y = unit.y + (-unit.width * vy - unit.height * nvy) / 2.
-
-    res = []
-    res.append((lf_x, lf_y, rf_x, rf_y))
-    res.append((rf_x, rf_y, rb_x, rb_y))
-    res.append((rb_x, rb_y, lb_x, lb_y))
-    res.append((lb_x, lb_y, lf_x, lf_y))
-    return res
-
-
-def get_world_borders():
+def build_world_borders():
     x = constants.WORLD_WIDTH / 2.
     y = constants.WORLD_HEIGHT / 2.
     fake_world_unit = Unit(0,
@@ -49,6 +94,15 @@ def get_world_borders():
     return get_borders(fake_world_unit)
 
 
+_world_borders = []
+
+
+def get_world_borders():
+    if not _world_borders:
+        _world_borders.extend(build_world_borders())
+    return _world_borders
+
+
 def alive(tank):
     return tank.crew_health > 0 and tank.hull_durability > 0
 
@@ -57,18 +111,64 @@ def is_teammate(tank, other_tank):
     return tank.player_name == other_tank.player_name
 
 
+class TankLists:
+    '''per-tick split of world.tanks by state and team, built once per tick, see get_tank_lists'''
+    def __init__(self, world):
+        tanks = world.tanks
+        self.tanks = tanks
+        self.alive = [alive(t) for t in tanks]
+
+        self.alive_tanks = [t for t, a in zip(tanks, self.alive) if a]
+        self.dead_tanks = [t for t, a in zip(tanks, self.alive) if not a]
+        self.enemies = [t for t in self.alive_tanks if not t.teammate]
+        self.teammates = [t for t in self.alive_tanks if t.teammate]
+        self.alive_team_number = len(set([t.player_name for t in self.alive_tanks]))
+
+
+def get_tank_lists(world):
+    lists = getattr(world, 'tank_lists', None)
+    if lists is None or lists.tanks is not world.tanks:
+        lists = TankLists(world)
+        world.tank_lists = lists
+    return lists
+
+
+class TickContext:
+    '''team-wide results shared by all teammate strategies within a tick'''
+    def __init__(self, world):
+        self.tick = world.tick
+        self.values = {}
+
+    def memoize(self, key, compute, *args):
+        try:
+            return self.values[key]
+        except KeyError:
+            value = compute(*args)
+            self.values[key] = value
+            return value
+
+
+def get_tick_context(world):
+    '''context is attached to the world, every strategy of the team gets the same world'''
+    context = getattr(world, 'tick_context', None)
+    if context is None:
+        context = TickContext(world)
+        world.tick_context = context
+    return context
+
+
 def other_tanks(world, tank):
     return filter(lambda t: t.id != tank.id, world.tanks)
 
 
 def all_enemies(world):
     '''alive tanks not in my team'''
-    return filter(lambda t: alive(t) and not t.teammate, world.tanks)
+    return get_tank_lists(world).enemies
 
 
 def all_teammates(world):
     '''alive tanks in my team'''
-    return filter(lambda t: alive(t) and t.teammate, world.tanks)
+    return get_tank_lists(world).teammates
 
 
 def all_teammates_without_me(world, me):
@@ -76,9 +176,7 @@ def all_teammates_without_me(world, me):
 
 
 def alive_team_number(world):
-    alive_tanks = filter(lambda t: alive(t), world.tanks)
-    player_names = set([t.player_name for t in alive_tanks])
-    return len(player_names)
+    return get_tank_lists(world).alive_team_number
 
 
 def life_factor(tank):
@@ -92,9 +190,8 @@ def get_turret_speed(tank):
     return degree_to_rad(life_factor(tank))
 
 
-def is_goal_blocked_by(shell, goal, blocker):
-    borders = get_borders(blocker)
-
+def get_shell_lines(shell, goal):
+    '''shell path up to the point nearest to goal and two pessimistic side lines'''
     gx, gy = get_nearest_point(shell.x, shell.y,
             shell.x + shell.speedX, shell.y + shell.speedY,
             goal.x, goal.y)
@@ -116,47 +213,297 @@ def is_goal_blocked_by(shell, goal, blocker):
     main_line = (gx, gy, shell.x, shell.y)
     border_line1 = (gx + dx, gy + dy, shell.x + dx, shell.y + dy)
     border_line2 = (gx - dx, gy - dy, shell.x - dx, shell.y - dy)
+    return [main_line, border_line1, border_line2]
 
-    for border in borders:
-        x1, y1, x2, y2 = border
-        if are_intervals_intersect(x1, y1, x2, y2, *main_line):
-            return True
-        if are_intervals_intersect(x1, y1, x2, y2, *border_line1):
-            return True
-        if are_intervals_intersect(x1, y1, x2, y2, *border_line2):
-            return True
 
-    return False
+# side lines are at most this far from the main line
+SHELL_LINES_MARGIN = 1.5 * SHELL_HEIGHT / 2. + 1.
 
 
-def get_blocker(shell, goal, world):
-    blockers = world.bonuses + \
-            filter(lambda t: not alive(t), world.tanks) + \
-            filter(lambda t: t.teammate, world.tanks) + \
-            world.obstacles
-    blockers = filter(lambda o: o.get_distance_to_unit(shell) > 0.01 and
-            o.get_distance_to_unit(goal) > 0.01, blockers)
-
-    for blocker in blockers:
-        if is_goal_blocked_by(shell, goal, blocker):
-            return blocker
-    return None
+def is_goal_blocked_by(shell, goal, blocker):
+    return geometry.any_intervals_intersect(get_borders(blocker), get_shell_lines(shell, goal))
 
 
-def get_static_blocker(shell, goal, world):
-    blockers = filter(lambda t: not alive(t), world.tanks) + world.obstacles
-    blockers = filter(lambda o: o.get_distance_to_unit(shell) > 0.01 and
-            o.get_distance_to_unit(goal) > 0.01, blockers)
+class MapData:
+    '''static structures of one obstacle layout, backed by the map cache on disk'''
+    def __init__(self, obstacles):
+        self.obstacles = obstacles
+        self.key = mapcache.layout_key(obstacles)
+        self.sections = mapcache.load_sections(self.key)
+        self.values = {}
+        self.dumps = {}
+        # there are sections to save at the start of the next tick
+        self.dirty = False
+
+    def get(self, name, build, dump=None, load=None):
+        '''load(obstacles, section) when the section is on disk, build(obstacles) otherwise
+        dump(value) packs the value into a section, None keeps the section as it is
+        '''
+        if name not in self.values:
+            value = None
+            if load is not None and name in self.sections:
+                value = load(self.obstacles, self.sections[name])
+            if value is None:
+                value = build(self.obstacles)
+                self.dirty = self.dirty or dump is not None
+            self.values[name] = value
+            if dump is not None:
+                self.dumps[name] = dump
+        return self.values[name]
+
+    def save(self):
+        for name, dump in self.dumps.iteritems():
+            section = dump(self.values[name])
+            if section is not None:
+                self.sections[name] = section
+        mapcache.save_sections(self.key, self.sections)
+        self.dirty = False
+
+
+_map_data = []
+
+
+def refresh_map_data(obstacles):
+    if not _map_data or (_map_data[0].obstacles is not obstacles and
+            _map_data[0].key != mapcache.layout_key(obstacles)):
+        _map_data[:] = [MapData(obstacles)]
+    map_data = _map_data[0]
+    map_data.obstacles = obstacles
+    if map_data.dirty:
+        map_data.save()
+    return map_data
+
+
+def get_map_data(world):
+    '''MapData of the current layout, kept between ticks and games'''
+    return get_tick_context(world).memoize('map_data', refresh_map_data, world.obstacles)
+
+
+def dump_points(points):
+    return array('d', [c for point in points for c in point]).tostring()
+
+
+def load_points(obstacles, section):
+    coords = array('d')
+    coords.fromstring(section)
+    return zip(coords[::2], coords[1::2])
 
-    for blocker in blockers:
-        if is_goal_blocked_by(shell, goal, blocker):
+
+def build_obstacle_grid(obstacles):
+    grid = spatial.SpatialGrid()
+    for index, obstacle in enumerate(obstacles):
+        grid.insert_unit(index, obstacle)
+    return grid
+
+
+def get_obstacle_grid(world):
+    '''obstacles never move, the grid is built once per map'''
+    return get_map_data(world).get('obstacle_grid', build_obstacle_grid,
+            lambda grid: grid.dump(), lambda obstacles, section: spatial.load_grid(section))
+
+
+def build_occupancy_grid(world):
+    static_map = get_static_map(world)
+    return navigation.build_occupancy_grid(static_map.obstacle_mask, static_map.mask_rows, MASK_CELL_SIZE)
+
+
+def update_navigation(world):
+    map_data = get_map_data(world)
+    grid = map_data.get('occupancy_grid', lambda obstacles: build_occupancy_grid(world),
+            lambda grid: str(grid.blocked),
+            lambda obstacles, section: navigation.load_occupancy_grid(section))
+    nav = map_data.get('navigation', lambda obstacles: navigation.Navigation(grid))
+    nav.update()
+    return nav
+
+
+def get_navigation(world):
+    '''distance fields are kept per map and shared by the team'''
+    return get_tick_context(world).memoize('navigation', update_navigation, world)
+
+
+def build_sight_table(obstacles):
+    table = spatial.SightTable(SHELL_LINES_MARGIN)
+    for x, y, radius in get_obstacle_circles(obstacles):
+        table.add_blocker(x, y, radius)
+    return table
+
+
+def load_sight_table(obstacles, section):
+    table = build_sight_table(obstacles)
+    return table if table.restore(section) else None
+
+
+def dump_sight_table(table):
+    # dead tanks belong to one game, such rows are not saved
+    return None if table.patches else table.dump()
+
+
+# computed sight rows worth saving the map cache again
+SIGHT_SAVE_ROW_STEP = 256
+
+
+def update_sight_table(world):
+    map_data = get_map_data(world)
+    table = map_data.get('sight_table', build_sight_table, dump_sight_table, load_sight_table)
+    # the patches follow the dead tanks of the tick, so wrecks of an earlier game go away
+    table.set_patches(dict((tank.id, (tank.x, tank.y, get_geometry(tank).radius))
+            for tank in get_tank_lists(world).dead_tanks))
+    if not table.patches and table.known_count - table.dumped_count >= SIGHT_SAVE_ROW_STEP:
+        map_data.dirty = True
+    return table
+
+
+def get_sight_table(world):
+    '''static line of sight over obstacles and dead tanks'''
+    return get_tick_context(world).memoize('sight_table', update_sight_table, world)
+
+
+def get_obstacle_circles(obstacles):
+    '''(x, y, radius) bounding circles'''
+    return [(o.x, o.y, get_geometry(o).radius) for o in obstacles]
+
+
+def build_zone_points(obstacles):
+    delta = 80.
+    min_x, min_y = delta, delta
+    max_x, max_y = 1280 - delta, 800 - delta
+
+    w_parts_number = int((max_x - min_x) / (2. * constants.ZONE_RADIUS))
+    w_step = (max_x - min_x) / w_parts_number
+
+    h_parts_number = int((max_y - min_y) / (2. * constants.ZONE_RADIUS))
+    h_step = (max_y - min_y) / h_parts_number
+
+    circles = get_obstacle_circles(obstacles)
+    base = delta
+    x = y = base
+    res = []
+    while x <= max_x + 1.:
+        while y <= max_y + 1.:
+            append = True
+            for ox, oy, radius in circles:
+                if math.hypot(x - ox, y - oy) < radius + 30.:
+                    append = False
+                    break
+            if append:
+                res.append((x, y))
+            y += h_step
+        y = base
+        x += w_step
+
+    return res
+
+
+MASK_CELL_SIZE = 10.
+
+
+def build_obstacle_mask(obstacles):
+    '''cells of MASK_CELL_SIZE overlapping an obstacle, indexed column * rows + row'''
+    columns = int(math.ceil(constants.WORLD_WIDTH / MASK_CELL_SIZE))
+    rows = int(math.ceil(constants.WORLD_HEIGHT / MASK_CELL_SIZE))
+    mask = bytearray(columns * rows)
+    half = MASK_CELL_SIZE / 2.
+    for obstacle in obstacles:
+        obstacle_geometry = get_geometry(obstacle)
+        radius = obstacle_geometry.radius
+        for i in xrange(max(0, int((obstacle.x - radius) / MASK_CELL_SIZE)),
+                min(columns, int((obstacle.x + radius) / MASK_CELL_SIZE) + 1)):
+            for j in xrange(max(0, int((obstacle.y - radius) / MASK_CELL_SIZE)),
+                    min(rows, int((obstacle.y + radius) / MASK_CELL_SIZE) + 1)):
+                cell_box = ((i + 0.5) * MASK_CELL_SIZE, (j + 0.5) * MASK_CELL_SIZE, 1., 0., half, half)
+                if geometry.are_boxes_overlapping(obstacle_geometry.box, cell_box):
+                    mask[i * rows + j] = 1
+    return mask
+
+
+class StaticMap:
+    '''everything about the map that stays the same for a whole game'''
+    def __init__(self, zone_points, obstacle_mask):
+        self.zone_points = zone_points
+        self.obstacle_mask = obstacle_mask
+        self.mask_rows = int(math.ceil(constants.WORLD_HEIGHT / MASK_CELL_SIZE))
+        self.world_borders = get_world_borders()
+
+
+def build_static_map(world):
+    map_data = get_map_data(world)
+    zone_points = map_data.get('zone_points', build_zone_points, dump_points, load_points)
+    obstacle_mask = map_data.get('obstacle_mask', build_obstacle_mask,
+            str, lambda obstacles, section: bytearray(section))
+    return StaticMap(zone_points, obstacle_mask)
+
+
+def get_static_map(world):
+    '''computed on the first tick of a map, from the map cache when it is there'''
+    return get_map_data(world).get('static_map', lambda obstacles: build_static_map(world))
+
+
+class BlockerIndex:
+    '''spatial grids of units by kind, queries return units in the order of world lists'''
+    def __init__(self, world):
+        lists = get_tank_lists(world)
+        self.units = {
+            'bonuses': world.bonuses,
+            'dead_tanks': lists.dead_tanks,
+            'teammates': filter(lambda t: t.teammate, world.tanks),
+            'obstacles': world.obstacles,
+            'tanks': world.tanks,
+        }
+        self.grids = {'obstacles': get_obstacle_grid(world)}
+        for kind, units in self.units.iteritems():
+            if kind in self.grids:
+                continue
+            grid = spatial.SpatialGrid()
+            for index, unit in enumerate(units):
+                grid.insert_unit(index, unit)
+            self.grids[kind] = grid
+
+    def query_segment(self, kinds, x1, y1, x2, y2, margin):
+        res = []
+        for kind in kinds:
+            units = self.units[kind]
+            res.extend([units[index] for index in sorted(self.grids[kind].query_segment(x1, y1, x2, y2, margin))])
+        return res
+
+    def query_box(self, kind, x_min, y_min, x_max, y_max):
+        units = self.units[kind]
+        return [units[index] for index in sorted(self.grids[kind].query_box(x_min, y_min, x_max, y_max))]
+
+
+def get_blocker_index(world):
+    return get_tick_context(world).memoize('blocker_index', BlockerIndex, world)
+
+
+def find_blocker(shell, goal, world, kinds, lines=None):
+    '''first unit of kinds (in kinds order) blocking shell path to goal'''
+    if lines is None:
+        lines = get_shell_lines(shell, goal)
+    x1, y1, x2, y2 = lines[0]
+    for blocker in get_blocker_index(world).query_segment(kinds, x1, y1, x2, y2, SHELL_LINES_MARGIN):
+        if blocker.get_distance_to_unit(shell) > 0.01 and blocker.get_distance_to_unit(goal) > 0.01 and \
+                geometry.any_intervals_intersect(get_borders(blocker), lines):
             return blocker
     return None
 
 
+def get_blocker(shell, goal, world):
+    return find_blocker(shell, goal, world, ['bonuses', 'dead_tanks', 'teammates', 'obstacles'])
+
+
+def get_static_blocker(shell, goal, world):
+    lines = get_shell_lines(shell, goal)
+    if get_sight_table(world).is_clear(*lines[0]):
+        return None
+    return find_blocker(shell, goal, world, ['dead_tanks', 'obstacles'], lines)
+
+
 def get_static_blocker_point(point, goal, world):
-    shell = make_possible_shell_to_target(point, goal)
-    return get_static_blocker(shell, goal, world)
+    def compute():
+        shell = make_possible_shell_to_target(point, goal)
+        return get_static_blocker(shell, goal, world)
+    return get_tick_context(world).memoize(
+            ('static_blocker_point', point.x, point.y, goal.x, goal.y), compute)
 
 
 def is_goal_static_blocked(shell, goal, world):
@@ -165,8 +512,7 @@ def is_goal_static_blocked(shell, goal, world):
 
 
 def is_goal_static_blocked_point(point, goal, world):
-    shell = make_possible_shell_to_target(point, goal)
-    return is_goal_static_blocked(shell, goal, world)
+    return get_static_blocker_point(point, goal, world) is not None
 
 
 def is_goal_blocked(shell, goal, world):
@@ -175,21 +521,15 @@ def is_goal_blocked(shell, goal, world):
 
 
 def is_goal_blocked_point(point, goal, world):
-    shell = make_possible_shell_to_target(point, goal)
-    return is_goal_blocked(shell, goal, world)
+    def compute():
+        shell = make_possible_shell_to_target(point, goal)
+        return is_goal_blocked(shell, goal, world)
+    return get_tick_context(world).memoize(
+            ('blocked_point', point.x, point.y, goal.x, goal.y), compute)
 
 
 def get_immobile_blocker(shell, goal, world):
-    blockers = world.bonuses + \
-            filter(lambda t: not alive(t), world.tanks) + \
-            world.obstacles
-    blockers = filter(lambda o: o.get_distance_to_unit(shell) > 0.01 and
-            o.get_distance_to_unit(goal) > 0.01, blockers)
-
-    for blocker in blockers:
-        if is_goal_blocked_by(shell, goal, blocker):
-            return blocker
-    return None
+    return find_blocker(shell, goal, world, ['bonuses', 'dead_tanks', 'obstacles'])
 
 
 def is_goal_immobile_blocked(shell, goal, world):